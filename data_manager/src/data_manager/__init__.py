@@ -2,7 +2,25 @@
 This package provides a framework for running ingest pipelines for GeoQuery, consisting of base classes meant to be inherited by ingest scripts.
 """
 
+from .aggregation import AGGREGATION_METHODS, aggregate_rasters, aggregate_stack
+from .cache import WorkerCache, file_key, worker_cache
+from .calc import raster_calc
+from .cog import (
+    benchmark_compression,
+    cog_overview_resampling,
+    cog_profile,
+    cog_validate_sampled,
+    compression_profile,
+)
 from .configuration import BaseDatasetConfiguration, get_config
 from .dataset import Dataset
+from .distance import cached_source_raster, distance_raster
+from .vector import (
+    iter_vector,
+    read_vector,
+    sql_in,
+    write_vector,
+    write_vector_batches,
+)
 
 __version__ = "0.4.6"
@@ -0,0 +1,108 @@
+import logging
+import os
+from collections.abc import Iterable, Sequence
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+import rasterio
+
+AGGREGATION_METHODS = ("mean", "min", "max", "sum", "var", "std")
+"""
+Aggregation methods supported by `aggregate_stack` and `aggregate_rasters`.
+"""
+
+
+def _reduce(stack: np.ma.MaskedArray, method: str) -> np.ma.MaskedArray:
+    if method == "mean":
+        return stack.mean(axis=0)
+    elif method == "min":
+        return stack.min(axis=0)
+    elif method == "max":
+        return stack.max(axis=0)
+    elif method == "sum":
+        return stack.sum(axis=0)
+    elif method == "var":
+        return stack.var(axis=0, ddof=1)
+    elif method == "std":
+        return stack.std(axis=0, ddof=1)
+    raise ValueError(
+        f"Invalid aggregation method {method!r}, must be one of {AGGREGATION_METHODS}"
+    )
+
+
+def aggregate_stack(
+    stack: np.ma.MaskedArray, methods: Iterable[str]
+) -> Dict[str, np.ma.MaskedArray]:
+    """
+    Aggregate a masked stack of same-shape layers along its first axis,
+    once for each method in `methods`.
+
+    Masked values are ignored, so a cell is only masked in a result if it
+    is masked in every layer. `var` and `std` are sample statistics
+    (`ddof=1`), matching pandas.
+
+    Parameters:
+        stack: Masked array of shape `(n, ...)`, e.g. `(month, y, x)`.
+        methods: Names of aggregation methods, from `AGGREGATION_METHODS`.
+
+    Returns:
+        A dict mapping each method to its aggregated masked array.
+    """
+    stack = np.ma.asarray(stack)
+    return {method: _reduce(stack, method) for method in methods}
+
+
+def aggregate_rasters(
+    file_list: Sequence[str | os.PathLike],
+    methods: Iterable[str] = ("mean",),
+    band: int = 1,
+    nodata: Optional[float] = None,
+) -> Tuple[Dict[str, np.ndarray], dict]:
+    """
+    Aggregate a band of multiple rasters with the same features (dimensions,
+    transform, pixel size, etc.) into a single layer per aggregation method.
+
+    Each raster is read exactly once, into a masked stack that every method
+    is computed from, so producing several aggregates (e.g. a yearly mean,
+    min, max and sum of monthly rasters) costs no more reads than one.
+
+    Files that cannot be opened are logged and left out of the aggregation.
+
+    Parameters:
+        file_list: Paths of rasters to aggregate.
+        methods: Names of aggregation methods, from `AGGREGATION_METHODS`.
+        band: Band of each raster to aggregate.
+        nodata: Value used for cells masked in every raster. Defaults to the nodata value of the input rasters.
+
+    Returns:
+        A tuple of a dict mapping each method to its aggregated 2D array, and the rasterio profile of the input rasters.
+    """
+    logger = logging.getLogger("dataset")
+
+    stack = None
+    profile = None
+    count = 0
+    for file_path in file_list:
+        try:
+            src = rasterio.open(file_path)
+        except Exception:
+            logger.error(f"Could not include file in aggregation ({file_path})")
+            continue
+        with src:
+            data = src.read(band, masked=True)
+            if stack is None:
+                profile = dict(src.profile)
+                stack = np.ma.empty((len(file_list), *data.shape), dtype=data.dtype)
+            elif data.shape != stack.shape[1:]:
+                raise ValueError("Dimensions of rasters do not match")
+            stack[count] = data
+            count += 1
+
+    if stack is None:
+        raise ValueError("No rasters could be read for aggregation")
+
+    if nodata is None:
+        nodata = profile["nodata"]
+
+    results = aggregate_stack(stack[:count], methods)
+    return {m: r.filled(nodata) for m, r in results.items()}, profile
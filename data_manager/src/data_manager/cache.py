@@ -0,0 +1,152 @@
+import os
+import threading
+from collections import OrderedDict
+from collections.abc import Callable, Hashable
+from typing import Any, Dict, Optional, Tuple
+
+import numpy as np
+
+
+def _sizeof(value: Any) -> int:
+    """
+    Approximate in-memory size of a cached value, counting only the large
+    buffers (numpy arrays, pandas objects) that size limits are meant for.
+    """
+    if isinstance(value, (tuple, list)):
+        return sum(_sizeof(v) for v in value)
+    if hasattr(value, "memory_usage"):
+        usage = value.memory_usage(deep=True)
+        return int(usage.sum() if hasattr(usage, "sum") else usage)
+    return int(getattr(value, "nbytes", 0))
+
+
+def _freeze(value: Any) -> Any:
+    """
+    Make the numpy arrays in a cached value read-only, since every task on
+    the worker shares them and an in-place change would leak into the rest.
+    """
+    if isinstance(value, (tuple, list)):
+        for v in value:
+            _freeze(v)
+    elif isinstance(value, np.ndarray):
+        value.flags.writeable = False
+    return value
+
+
+def file_key(path: str | os.PathLike) -> Tuple[str, int, int]:
+    """
+    Cache key for a value loaded from a file, which changes whenever the
+    file is rewritten so that stale values are never returned.
+    """
+    stat = os.stat(path)
+    return (os.fspath(path), stat.st_size, stat.st_mtime_ns)
+
+
+class WorkerCache:
+    """
+    A thread-safe, size-bounded least recently used cache for values that
+    are expensive to load, such as opened datasets or parsed arrays.
+
+    The same value is returned to every caller, so values must not be
+    modified; numpy arrays (alone or in a tuple or list) are made read-only
+    when they are cached. Mutable containers such as pandas DataFrames
+    can't be protected this way and shouldn't be cached.
+
+    Values are evicted least recently used first once there are more than
+    `max_entries` of them, or their total size (as far as it can be
+    measured, see `_sizeof`) exceeds `max_bytes`. The most recently used
+    value is always kept, however large. Evicted values are only dropped
+    from the cache, not closed, since a task may still be using them; file
+    handles are closed once they are garbage collected.
+    """
+
+    def __init__(self, max_entries: int = 8, max_bytes: Optional[int] = None):
+        """
+        Parameters:
+            max_entries: Maximum number of values to keep.
+            max_bytes: Maximum total size of values to keep, unbounded if `None`.
+        """
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._values: OrderedDict[Hashable, Tuple[Any, int]] = OrderedDict()
+        self._loading: Dict[Hashable, threading.Lock] = {}
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._values)
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._values
+
+    @property
+    def nbytes(self) -> int:
+        return sum(size for _, size in self._values.values())
+
+    def get(self, key: Hashable, loader: Callable[[], Any]) -> Any:
+        """
+        Return the value cached under `key`, calling `loader` to load and
+        cache it if it isn't cached yet. Concurrent calls for the same key
+        wait for a single load rather than each loading it.
+        """
+        with self._lock:
+            if key in self._values:
+                self._values.move_to_end(key)
+                return self._values[key][0]
+            key_lock = self._loading.setdefault(key, threading.Lock())
+
+        with key_lock:
+            with self._lock:
+                if key in self._values:
+                    self._values.move_to_end(key)
+                    return self._values[key][0]
+            try:
+                value = loader()
+            except BaseException:
+                with self._lock:
+                    self._loading.pop(key, None)
+                raise
+            with self._lock:
+                self._values[key] = (_freeze(value), _sizeof(value))
+                self._loading.pop(key, None)
+                self._evict()
+            return value
+
+    def _evict(self):
+        while len(self._values) > 1 and (
+            len(self._values) > self.max_entries
+            or (self.max_bytes is not None and self.nbytes > self.max_bytes)
+        ):
+            self._values.popitem(last=False)
+
+    def clear(self):
+        """
+        Drop every cached value.
+        """
+        with self._lock:
+            self._values.clear()
+
+
+_caches: Dict[int, WorkerCache] = {}
+_caches_lock = threading.Lock()
+
+
+def worker_cache(max_entries: int = 8, max_bytes: Optional[int] = None) -> WorkerCache:
+    """
+    Get the `WorkerCache` of the current process, creating it if needed.
+
+    Caches are scoped to a process, so that a worker process never sees
+    values (e.g. open file handles) inherited from the process it was
+    forked from. Every thread of a process shares its cache. The limits
+    given when the cache is first created are updated by later calls.
+    """
+    pid = os.getpid()
+    with _caches_lock:
+        cache = _caches.get(pid)
+        if cache is None:
+            # drop caches inherited from a parent process
+            _caches.clear()
+            cache = _caches[pid] = WorkerCache(max_entries, max_bytes)
+        else:
+            cache.max_entries = max_entries
+            cache.max_bytes = max_bytes
+        return cache
@@ -0,0 +1,193 @@
+import os
+import threading
+from collections.abc import Callable, Iterable, Iterator, Mapping, Sequence
+from concurrent.futures import FIRST_COMPLETED, Executor, ThreadPoolExecutor, wait
+from contextlib import ExitStack
+from tempfile import mkstemp
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+import rasterio
+from rasterio.windows import Window
+
+from .cog import cog_overview_resampling, compression_profile
+
+
+def _map_bounded(
+    pool: Executor, func: Callable[[Any], Any], items: Iterable[Any], max_pending: int
+) -> Iterator[Tuple[Any, Any]]:
+    """
+    Run `func` on each item on `pool`, yielding `(item, result)` pairs as
+    they complete. At most `max_pending` items are submitted ahead of the
+    results being consumed, so that results of a large grid don't pile up in
+    memory faster than they are written.
+    """
+    items = iter(items)
+    pending = {}
+    for item in items:
+        pending[pool.submit(func, item)] = item
+        if len(pending) >= max_pending:
+            break
+    while pending:
+        done, _ = wait(pending, return_when=FIRST_COMPLETED)
+        for future in done:
+            item = pending.pop(future)
+            yield item, future.result()
+            for item in items:
+                pending[pool.submit(func, item)] = item
+                break
+
+
+def raster_calc(
+    inputs: Sequence[str | os.PathLike],
+    outputs: Mapping[str | os.PathLike, Callable[..., np.ndarray]],
+    dtypes: Optional[Mapping[str | os.PathLike, str]] = None,
+    nodata: Optional[Mapping[str | os.PathLike, Optional[float]]] = None,
+    categorical: Optional[Mapping[str | os.PathLike, bool]] = None,
+    band: int = 1,
+    block_size: int = 1024,
+    max_workers: Optional[int] = None,
+    scratch_dir: Optional[str | os.PathLike] = None,
+    **creation_options,
+) -> None:
+    """
+    Compute one or more Cloud Optimized GeoTIFFs from the values of one or
+    more aligned input rasters, reading every input only once.
+
+    The grid is processed in windows of `block_size` cells on a thread
+    pool. For each window, a band of every input is read and passed to
+    every output's function, so that several products derived from the
+    same inputs (e.g. a clipped value raster and a binary mask) share their
+    reads. Finished windows are streamed to an intermediate tiled GeoTIFF in
+    local scratch space as they complete, only a few windows ahead of the
+    writes, before each output is translated into a COG.
+
+    Here is an example of its use:
+
+    ```python
+    raster_calc(
+        [radiance_path, coverage_path],
+        {
+            clipped_path: lambda rad, cvg: np.maximum(rad, 0),
+            mask_path: lambda rad, cvg: cvg >= 1,
+        },
+        dtypes={mask_path: "uint8"},
+    )
+    ```
+
+    Parameters:
+        inputs: Paths of the rasters to read, which must all have the same dimensions and transform.
+        outputs: Mapping of each output path to a function that takes a window of each input (in the order of `inputs`) and returns the output values for it.
+        dtypes: Data type of each output. Defaults to the data type of the first input.
+        nodata: Nodata value of each output. Defaults to the nodata value of the first input for outputs of its data type, and none for others.
+        categorical: Whether the values of each output are categories, which decides how it is compressed and how its overviews are resampled. Defaults to guessing from the data type (see `cog_overview_resampling`), so continuous `uint8` outputs should be marked `False`.
+        band: Band of each input to read.
+        block_size: Width and height of each window, in cells. Must be a multiple of 16.
+        max_workers: Number of threads processing windows. Defaults to the number of CPU cores.
+        scratch_dir: Directory of the intermediate GeoTIFFs, which should be on fast local storage. Defaults to the system's temporary directory.
+        creation_options: Extra GeoTIFF creation options for the outputs, e.g. `BIGTIFF="YES"`. Outputs are compressed according to their data type by default (see `compression_profile`).
+    """
+    from rio_cogeo.cogeo import cog_translate
+    from rio_cogeo.profiles import cog_profiles
+
+    if not inputs:
+        raise ValueError("raster_calc requires at least one input")
+    dtypes = dtypes or {}
+    nodata = nodata or {}
+    categorical = categorical or {}
+
+    with rasterio.open(inputs[0]) as src:
+        base = src.profile
+        for path in inputs[1:]:
+            with rasterio.open(path) as other:
+                if other.shape != src.shape or other.transform != src.transform:
+                    raise ValueError(f"Input {path} is not aligned with {inputs[0]}")
+    height, width = base["height"], base["width"]
+
+    windows = [
+        Window(col, row, min(block_size, width - col), min(block_size, height - row))
+        for row in range(0, height, block_size)
+        for col in range(0, width, block_size)
+    ]
+
+    # rasterio datasets can't be shared between threads, so each thread
+    # opens its own handles on the inputs
+    local = threading.local()
+    handles: List[rasterio.DatasetReader] = []
+    handles_lock = threading.Lock()
+
+    def calc(window: Window) -> Dict[str, np.ndarray]:
+        if not hasattr(local, "srcs"):
+            local.srcs = [rasterio.open(path) for path in inputs]
+            with handles_lock:
+                handles.extend(local.srcs)
+        arrays = [src.read(band, window=window) for src in local.srcs]
+        return {dst_path: function(*arrays) for dst_path, function in outputs.items()}
+
+    tiles_paths = {}
+    try:
+        for dst_path in outputs:
+            fd, tiles_paths[dst_path] = mkstemp(suffix=".tiles.tif", dir=scratch_dir)
+            os.close(fd)
+        with ExitStack() as stack:
+            dsts = {}
+            for dst_path, tiles_path in tiles_paths.items():
+                dtype = dtypes.get(dst_path, base["dtype"])
+                dsts[dst_path] = stack.enter_context(
+                    rasterio.open(
+                        tiles_path,
+                        "w",
+                        driver="GTiff",
+                        dtype=dtype,
+                        count=1,
+                        height=height,
+                        width=width,
+                        crs=base["crs"],
+                        transform=base["transform"],
+                        nodata=nodata.get(
+                            dst_path,
+                            base["nodata"] if dtype == base["dtype"] else None,
+                        ),
+                        tiled=True,
+                        blockxsize=block_size,
+                        blockysize=block_size,
+                        compress="LZW",
+                        **{"BIGTIFF": "IF_SAFER", **creation_options},
+                    )
+                )
+            max_workers = max_workers or os.cpu_count()
+            with ThreadPoolExecutor(max_workers) as pool:
+                for window, results in _map_bounded(
+                    pool, calc, windows, 2 * max_workers
+                ):
+                    for dst_path, data in results.items():
+                        dst = dsts[dst_path]
+                        dst.write(
+                            np.asarray(data).astype(dst.dtypes[0], copy=False),
+                            1,
+                            window=window,
+                        )
+
+        for dst_path, tiles_path in tiles_paths.items():
+            dtype = dtypes.get(dst_path, base["dtype"])
+            is_categorical = categorical.get(dst_path)
+            dst_profile = cog_profiles.get("lzw")
+            dst_profile.update(
+                compression_profile(dtype, is_categorical, driver="GTiff")
+            )
+            dst_profile.update(creation_options)
+            cog_translate(
+                tiles_path,
+                dst_path,
+                dst_profile,
+                overview_resampling=cog_overview_resampling(dtype, is_categorical),
+                in_memory=False,
+                quiet=True,
+                config={"GDAL_NUM_THREADS": "ALL_CPUS"},
+            )
+    finally:
+        for src in handles:
+            src.close()
+        for tiles_path in tiles_paths.values():
+            if os.path.exists(tiles_path):
+                os.remove(tiles_path)
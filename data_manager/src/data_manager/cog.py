@@ -0,0 +1,330 @@
+import functools
+import os
+import time
+import warnings
+from collections.abc import Mapping
+from tempfile import TemporaryDirectory
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+import rasterio
+import rasterio.shutil
+from rasterio.errors import RasterioIOError
+from rasterio.windows import Window
+
+# data types whose values are treated as classes (land cover codes, masks)
+# rather than quantities when choosing how overviews are resampled
+CATEGORICAL_DTYPES = ("bool", "uint8")
+
+# codec, predictor and level for each kind of output. The floating point
+# predictor (3) and horizontal differencing (2) turn smoothly varying values
+# into small, repetitive differences that compress much better; class codes
+# aren't smooth, so categorical data is compressed as is
+COMPRESSION_PROFILES: Dict[str, Dict[str, Any]] = {
+    "float": {"compress": "ZSTD", "predictor": 3, "level": 9},
+    "integer": {"compress": "ZSTD", "predictor": 2, "level": 9},
+    "categorical": {"compress": "ZSTD", "predictor": 1, "level": 9},
+}
+
+# codec used instead of ZSTD when GDAL is built without it, and its level
+FALLBACK_CODEC = "DEFLATE"
+FALLBACK_LEVEL = 6
+
+# names of each codec's level creation option, for the GTiff driver (the
+# COG driver calls them all LEVEL)
+GTIFF_LEVEL_OPTIONS = {"ZSTD": "zstd_level", "DEFLATE": "zlevel"}
+
+COG_PREDICTORS = {1: "NO", 2: "STANDARD", 3: "FLOATING_POINT"}
+
+
+def _is_categorical(dtype: str, categorical: Optional[bool]) -> bool:
+    if categorical is None:
+        return str(np.dtype(dtype)) in CATEGORICAL_DTYPES
+    return categorical
+
+
+@functools.lru_cache
+def gdal_has_codec(codec: str) -> bool:
+    """
+    Whether the installed GDAL can write GeoTIFFs compressed with `codec`.
+    """
+    path = f"/vsimem/codec_check_{codec}.tif"
+    # GDAL only warns about unsupported creation options, so check what was
+    # actually written
+    try:
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore")
+            with rasterio.open(
+                path,
+                "w",
+                driver="GTiff",
+                width=1,
+                height=1,
+                count=1,
+                dtype="uint8",
+                compress=codec,
+            ) as dst:
+                dst.write(np.zeros((1, 1, 1), dtype="uint8"))
+            with rasterio.open(path) as written:
+                compression = written.tags(ns="IMAGE_STRUCTURE").get("COMPRESSION")
+    except Exception:
+        return False
+    finally:
+        try:
+            rasterio.shutil.delete(path)
+        except Exception:
+            pass
+    return compression == codec.upper()
+
+
+def compression_profile(
+    dtype: str,
+    categorical: Optional[bool] = None,
+    driver: str = "COG",
+    codec: Optional[str] = None,
+    level: Optional[int] = None,
+) -> Dict[str, Any]:
+    """
+    Compression creation options for a raster of the given data type (see
+    `COMPRESSION_PROFILES`), falling back from ZSTD to DEFLATE if the
+    installed GDAL doesn't support it.
+
+    Parameters:
+        dtype: Data type of the raster.
+        categorical: Whether the raster's values are categories, see `cog_overview_resampling`.
+        driver: Driver the options are for, either "COG" or "GTiff" (which name the predictor and level options differently).
+        codec: Compression codec to use instead of the profile's, e.g. "DEFLATE".
+        level: Compression level to use instead of the profile's.
+    """
+    if _is_categorical(dtype, categorical):
+        kind = "categorical"
+    elif np.issubdtype(np.dtype(dtype), np.floating):
+        kind = "float"
+    else:
+        kind = "integer"
+    profile = COMPRESSION_PROFILES[kind]
+
+    if codec is None:
+        codec = profile["compress"]
+        if codec == "ZSTD" and not gdal_has_codec("ZSTD"):
+            codec, level = FALLBACK_CODEC, level or FALLBACK_LEVEL
+    if level is None and codec == profile["compress"]:
+        level = profile["level"]
+    predictor = profile["predictor"]
+
+    if driver == "COG":
+        options = {"compress": codec, "predictor": COG_PREDICTORS[predictor]}
+        if level is not None:
+            options["level"] = level
+    else:
+        options = {"compress": codec, "predictor": predictor}
+        if level is not None and codec in GTIFF_LEVEL_OPTIONS:
+            options[GTIFF_LEVEL_OPTIONS[codec]] = level
+    return options
+
+
+def cog_overview_resampling(dtype: str, categorical: Optional[bool] = None) -> str:
+    """
+    Resampling method for the overviews of a COG: "nearest" for categorical
+    data, for which averaging classes would invent new ones, and "average"
+    for continuous data.
+
+    Parameters:
+        dtype: Data type of the raster.
+        categorical: Whether the raster's values are categories. Defaults to `True` for `uint8` and `bool` rasters, and `False` for others.
+    """
+    return "nearest" if _is_categorical(dtype, categorical) else "average"
+
+
+def cog_profile(
+    dtype: str,
+    categorical: Optional[bool] = None,
+    overview_count: Optional[int] = None,
+    reuse_overviews: bool = False,
+    blocksize: int = 512,
+    **options,
+) -> Dict[str, Any]:
+    """
+    Creation options for writing a COG with GDAL's COG driver, which can
+    be passed to `rasterio.open()` or `rasterio.shutil.copy()` alongside
+    the raster's own profile.
+
+    Tiles are compressed according to the data type (see
+    `compression_profile`), and overviews are resampled according to it
+    (see `cog_overview_resampling`). Both are done on all CPU cores, since
+    building overviews single-threaded dominates the cost of writing large
+    global COGs.
+
+    Here is an example of its use:
+
+    ```python
+    with rasterio.open(tmp_dst, "w", **meta, **cog_profile(meta["dtype"])) as dst:
+        ...
+    ```
+
+    Parameters:
+        dtype: Data type of the raster.
+        categorical: Whether the raster's values are categories, see `cog_overview_resampling`.
+        overview_count: Number of overview levels. Defaults to as many as it takes for the smallest to fit in one block.
+        reuse_overviews: If set to `True`, overviews already present in the source (e.g. a VRT of tiles that have their own overviews) are copied instead of being computed again. Only has an effect when copying a dataset, e.g. with `rasterio.shutil.copy()`.
+        blocksize: Width and height of tiles.
+        options: Extra creation options, which override the defaults, e.g. `BIGTIFF="YES"`.
+    """
+    profile = {
+        "driver": "COG",
+        **compression_profile(dtype, categorical),
+        "blocksize": blocksize,
+        "overview_resampling": cog_overview_resampling(dtype, categorical),
+        "overviews": "AUTO" if reuse_overviews else "IGNORE_EXISTING",
+        "num_threads": "ALL_CPUS",
+    }
+    if overview_count is not None:
+        profile["overview_count"] = overview_count
+    profile.update(options)
+    return profile
+
+
+def cog_validate_sampled(
+    path: str | os.PathLike, samples: int = 8
+) -> Tuple[bool, List[str], List[str]]:
+    """
+    Check that a GeoTIFF is a Cloud Optimized GeoTIFF without walking its
+    whole structure, for outputs too large for `rio_cogeo.cog_validate` to
+    be cheap.
+
+    The layout GDAL records in the file header (written by the COG driver
+    and by `cog_translate`) is trusted for the ordering of IFDs and tiles,
+    and a sample of tiles, spread evenly over the full resolution image and
+    each overview level, is decoded to catch truncated or corrupt data.
+    The return value has the same form as `rio_cogeo.cog_validate`.
+
+    Parameters:
+        path: Path of the GeoTIFF to check.
+        samples: Number of tiles decoded at full resolution. One tile of each overview level is decoded as well.
+    """
+    errors: List[str] = []
+    warnings: List[str] = []
+
+    try:
+        with rasterio.open(path) as src:
+            if src.driver != "GTiff":
+                return False, [f"The file is not a GeoTIFF ({src.driver})"], []
+            if src.tags(ns="IMAGE_STRUCTURE").get("LAYOUT") != "COG":
+                errors.append("The file header does not declare a COG layout")
+            if not src.profile.get("tiled"):
+                errors.append("The file is not tiled")
+            overviews = src.overviews(1)
+            if max(src.width, src.height) > 512 and not overviews:
+                warnings.append(
+                    "The file is greater than 512xH or 512xW, it is recommended to include internal overviews"
+                )
+            if errors:
+                return False, errors, warnings
+
+            windows = [window for _, window in src.block_windows(1)]
+            picks = np.linspace(0, len(windows) - 1, min(samples, len(windows)))
+            for ix in sorted(set(picks.round().astype(int))):
+                src.read(window=windows[ix])
+        for level in range(len(overviews)):
+            with rasterio.open(path, overview_level=level) as ovr:
+                _, window = next(ovr.block_windows(1))
+                ovr.read(window=window)
+    except RasterioIOError as e:
+        errors.append(f"Failed to read tile data: {e}")
+
+    return not errors, errors, warnings
+
+
+def benchmark_compression(
+    path: str | os.PathLike,
+    candidates: Optional[Mapping[str, Dict[str, Any]]] = None,
+    window_size: int = 2048,
+    band: int = 1,
+    repeats: int = 3,
+    categorical: Optional[bool] = None,
+) -> List[Dict[str, Any]]:
+    """
+    Compare compression options on a sample of a raster, to tune the size
+    of outputs against how fast they can be read back (e.g. by zonal
+    statistics extraction).
+
+    A window from the center of the raster is written once with each
+    candidate's GTiff creation options, as 512x512 tiles, then read back
+    `repeats` times. The fastest read is reported.
+
+    Here is an example of its use:
+
+    ```python
+    for row in benchmark_compression("slope.tif"):
+        print(row["name"], row["ratio"], row["read_mb_per_s"])
+    ```
+
+    Parameters:
+        path: Path of the raster to sample.
+        candidates: Mapping of a name for each candidate to its GTiff creation options. Defaults to LZW (the previous default), and DEFLATE and ZSTD at several levels with the predictor for the raster's data type.
+        window_size: Width and height of the sample window, in cells.
+        band: Band to sample.
+        repeats: Number of times each candidate is read back.
+        categorical: Whether the raster's values are categories, see `compression_profile`.
+
+    Returns:
+        A list with one dictionary per candidate, smallest output first, with its `name`, `options`, compressed size in `bytes`, compression `ratio`, `write_seconds` and `read_mb_per_s` (of uncompressed data).
+    """
+    with rasterio.open(path) as src:
+        width, height = min(window_size, src.width), min(window_size, src.height)
+        window = Window(
+            (src.width - width) // 2, (src.height - height) // 2, width, height
+        )
+        data = src.read(band, window=window)
+        profile = {
+            "driver": "GTiff",
+            "dtype": src.dtypes[band - 1],
+            "nodata": src.nodata,
+            "count": 1,
+            "width": width,
+            "height": height,
+            "crs": src.crs,
+            "transform": src.window_transform(window),
+            "tiled": True,
+            "blockxsize": 512,
+            "blockysize": 512,
+        }
+
+    if candidates is None:
+        dtype = profile["dtype"]
+        candidates = {"lzw": {"compress": "LZW"}}
+        for codec, levels in (("DEFLATE", (1, 6, 9)), ("ZSTD", (1, 9, 15))):
+            if gdal_has_codec(codec):
+                for level in levels:
+                    candidates[f"{codec.lower()}-{level}"] = compression_profile(
+                        dtype, categorical, driver="GTiff", codec=codec, level=level
+                    )
+
+    results = []
+    with TemporaryDirectory() as tmp_dir:
+        for name, options in candidates.items():
+            dst_path = os.path.join(tmp_dir, f"{name}.tif")
+            start = time.perf_counter()
+            with rasterio.open(dst_path, "w", **profile, **options) as dst:
+                dst.write(data, 1)
+            write_seconds = time.perf_counter() - start
+
+            read_seconds = []
+            for _ in range(repeats):
+                start = time.perf_counter()
+                with rasterio.open(dst_path) as written:
+                    written.read(1)
+                read_seconds.append(time.perf_counter() - start)
+
+            size = os.path.getsize(dst_path)
+            results.append(
+                {
+                    "name": name,
+                    "options": dict(options),
+                    "bytes": size,
+                    "ratio": data.nbytes / size,
+                    "write_seconds": write_seconds,
+                    "read_mb_per_s": data.nbytes / 1024**2 / min(read_seconds),
+                }
+            )
+    return sorted(results, key=lambda row: row["bytes"])
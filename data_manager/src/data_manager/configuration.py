@@ -68,6 +68,15 @@ class RunParameters(BaseModel):
     Time in seconds to wait between task retries.
     This parameter can be overridden per task run when calling `Dataset.run_tasks()`
     """
+    cache_max_entries: int = 8
+    """
+    Maximum number of values each worker process keeps in the cache used by `Dataset.cached()`.
+    """
+    cache_max_bytes: Optional[int] = 4 * 1024**3
+    """
+    Maximum total size in bytes of arrays each worker process keeps in the cache used by `Dataset.cached()`.
+    If set to `None`, only `cache_max_entries` limits the cache.
+    """
     conda_env: str = "geodata38"
     """
     Conda environment to use when running the dataset.
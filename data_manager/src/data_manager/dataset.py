@@ -1,22 +1,25 @@
 import csv
+import glob
 import logging
 import multiprocessing
 import os
 import re
-import shutil
+import threading
 import time
 from abc import ABC, abstractmethod
 from collections import namedtuple
-from collections.abc import Callable, Iterable, Sequence
+from collections.abc import Callable, Hashable, Iterable, Sequence
 from concurrent.futures import wait
 from contextlib import contextmanager
 from datetime import datetime
 from pathlib import Path
-from tempfile import mkdtemp, mkstemp
-from typing import Any, Dict, Optional
+from tempfile import mkstemp
+from typing import Any, Dict, List, Literal, Optional
 
 from rio_cogeo import cog_validate
 
+from .cache import worker_cache
+from .cog import cog_validate_sampled
 from .configuration import RunParameters
 
 """
@@ -27,6 +30,15 @@ TaskResult = namedtuple(
     "TaskResult", ["status_code", "status_message", "args", "result"]
 )
 
+# name of a temporary file created by Dataset.tmp_to_dst_file (mkstemp adds
+# 8 random characters), or of a sidecar file written next to one
+_TMP_NAME = re.compile(r"^\..+\.tmp-[a-z0-9_]{8}")
+
+# the process umask, read once at import: os.umask can only be read by
+# setting it, which would briefly change it for every other thread
+_UMASK = os.umask(0)
+os.umask(_UMASK)
+
 
 class ResultTuple(Sequence):
     """
@@ -130,7 +142,8 @@ class Dataset(ABC):
         final_dst: str | os.PathLike,
         make_dst_dir: bool = False,
         tmp_dir: Optional[str | os.PathLike] = None,
-        validate_cog: bool = False,
+        validate_cog: bool | Literal["full", "sampled"] = False,
+        fsync: Literal["none", "file", "full"] = "none",
     ):
         """
         Context manager that provides a temporary file path to write
@@ -139,6 +152,17 @@ class Dataset(ABC):
         from leaving partially-written files in the filesystem where
         they might be mistaken for complete files.
 
+        The temporary file is created on the same filesystem as `final_dst`
+        (by default as a hidden file next to it), so that it can be
+        committed with an atomic `os.replace`, which only updates metadata,
+        instead of copying the whole file across filesystems. If the
+        context is exited with an exception, the temporary file is removed.
+        Only a process that is killed outright can leave one behind, as a
+        hidden `.<name>.tmp-*` file; see `remove_stale_tmp_files`. Hidden
+        files are still returned by `Path.iterdir()` and `Path.glob()`, so
+        code listing inputs in such a directory must skip names starting
+        with `.`.
+
         Additionally, this context manager can create output directories
         that don't exist yet, or validate COG files after they've been
         written. See the list of parameters below for more information.
@@ -154,11 +178,15 @@ class Dataset(ABC):
         Parameters:
             final_dst: Path to where the file should be written.
             make_dst_dir: If set to true, the parent directory of `final_dst` will be created (and any of its parents, as necessary)
-            tmp_dir: Path to directory where file should be temporarily stored. If set to `None`, a default directory will be used.
-            validate_cog: If set to `True`, the written file will be validated as a COG, and an exception will be raised if this validation fails.
+            tmp_dir: Path to directory where file should be temporarily stored. If set to `None`, or to a directory on a different filesystem than `final_dst`, the parent directory of `final_dst` will be used.
+            validate_cog: If set to `True` (or `"full"`), the written file will be validated as a COG with `rio_cogeo.cog_validate` when the context is exited, and an exception will be raised if this validation fails, instead of moving the file into place, so that the task writing it fails. `"sampled"` uses the cheaper `cog_validate_sampled` instead, for very large outputs.
+            fsync: When to flush data to disk. `"none"` leaves it to the operating system, `"file"` syncs the temporary file before it is renamed, so the final file is never visible with incomplete contents after a crash, and `"full"` additionally syncs the destination directory so that the rename itself is durable.
         """
         logger = self.get_logger()
 
+        if fsync not in ("none", "file", "full"):
+            raise ValueError(f"Unknown fsync policy: {fsync}")
+
         final_dst = Path(final_dst)
 
         # make sure that final_dst parent directory exists
@@ -170,57 +198,169 @@ class Dataset(ABC):
                     f"Parent directory of requested filepath {str(final_dst)} does not exist."
                 )
 
-        tmp_sub_dir = mkdtemp(dir=tmp_dir)
-        _, tmp_path = mkstemp(dir=tmp_sub_dir)
+        # a rename is only atomic (and only avoids a copy) within one
+        # filesystem, so a tmp_dir anywhere else is replaced by final_dst's
+        # own directory
+        if tmp_dir is None:
+            tmp_dir = final_dst.parent
+        elif os.stat(tmp_dir).st_dev != os.stat(final_dst.parent).st_dev:
+            logger.debug(
+                f"{str(tmp_dir)} is not on the same filesystem as {str(final_dst)}, writing temporary file next to it instead"
+            )
+            tmp_dir = final_dst.parent
+
+        # the suffix is kept so that writers can infer the format from the
+        # name. The leading dot hides the file from shell globs and glob.glob,
+        # but not from Path.iterdir() or Path.glob(), so code listing a
+        # directory written to this way must skip names starting with "."
+        fd, tmp_path = mkstemp(
+            dir=tmp_dir, prefix=f".{final_dst.name}.tmp-", suffix=final_dst.suffix
+        )
+        os.close(fd)
         logger.debug(
             f"Created temporary file {tmp_path} with final destination {str(final_dst)}"
         )
-        yield tmp_path
+        try:
+            yield tmp_path
+        except BaseException:
+            self._remove_tmp_files(tmp_path)
+            raise
 
         # validate Cloud Optimized GeoTIFF
         # doing this before move because disk r/w is almost certainly faster
         if validate_cog:
-            is_valid, errors, warnings = cog_validate(tmp_path)
-            if is_valid:
-                logger.info(
-                    f"Successfully validated output COG {tmp_path} (destined for {str(final_dst)}))"
-                )
+            if validate_cog == "sampled":
+                is_valid, errors, warnings = cog_validate_sampled(tmp_path)
             else:
-                logger.exception(
-                    f"Failed to validate COG {tmp_path} (destined for {str(final_dst)})"
-                )
+                is_valid, errors, warnings = cog_validate(tmp_path, quiet=True)
             for error in errors:
                 logger.error(f"Error encountered when validating COG: {error}")
             for warning in warnings:
                 logger.warning(f"Warning encountered when validating COG: {warning}")
+            if not is_valid:
+                self._remove_tmp_files(tmp_path)
+                raise ValueError(
+                    f"Failed to validate COG {tmp_path} (destined for {str(final_dst)}): {'; '.join(errors)}"
+                )
+            logger.info(
+                f"Successfully validated output COG {tmp_path} (destined for {str(final_dst)}))"
+            )
 
-        # mkstemp creates files with mode 0600 and shutil.move preserves it,
+        # mkstemp creates files with mode 0600 and os.replace preserves it,
         # which would leave files on shared storage unreadable by the group.
-        # Widen to what a plain open() would have produced under the current
+        # Widen to what a plain open() would have produced under the process
         # umask, so using this context manager doesn't change file permissions.
-        umask = os.umask(0)
-        os.umask(umask)
-        os.chmod(tmp_path, 0o666 & ~umask)
+        os.chmod(tmp_path, 0o666 & ~_UMASK)
+
+        if fsync != "none":
+            fd = os.open(tmp_path, os.O_RDONLY)
+            try:
+                os.fsync(fd)
+            finally:
+                os.close(fd)
 
         # move file from tmp_path to final_dst
         try:
             logger.debug(f"Attempting to move {tmp_path} to {str(final_dst)}")
-            shutil.move(tmp_path, final_dst)
+            os.replace(tmp_path, final_dst)
         except Exception:
             logger.exception(
                 f"Failed to transfer temporary file {tmp_path} to final destination {str(final_dst)}"
             )
-        else:
-            logger.debug(
-                f"Successfully transferred {tmp_path} to final destination {str(final_dst)}"
-            )
+            self._remove_tmp_files(tmp_path)
+            raise
+        logger.debug(
+            f"Successfully transferred {tmp_path} to final destination {str(final_dst)}"
+        )
+        if fsync == "full":
+            fd = os.open(final_dst.parent, os.O_RDONLY)
+            try:
+                os.fsync(fd)
+            finally:
+                os.close(fd)
 
-        # remove the per-file temporary subdirectory; if the move failed the
-        # directory is not empty, and is deliberately left behind for debugging
-        try:
-            os.rmdir(tmp_sub_dir)
-        except OSError:
-            pass
+        # writers sometimes leave sidecar files next to the path they were
+        # given (e.g. GDAL's .aux.xml), which would otherwise be left behind
+        # in the destination directory
+        self._remove_tmp_files(tmp_path, keep_main=True)
+
+    @staticmethod
+    def _remove_tmp_files(tmp_path: str, keep_main: bool = False):
+        """
+        Remove a temporary file created by `tmp_to_dst_file`, and any
+        sidecar files written next to it (e.g. `.aux.xml`, or `-wal` and
+        `-journal` for GeoPackages).
+        """
+        paths = glob.glob(glob.escape(tmp_path) + "[.-]*")
+        if not keep_main:
+            paths.append(tmp_path)
+        for path in paths:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+    @staticmethod
+    def remove_stale_tmp_files(
+        directory: str | os.PathLike, max_age: float = 24 * 60 * 60
+    ) -> List[Path]:
+        """
+        Remove temporary files left in `directory` (and its subdirectories)
+        by `tmp_to_dst_file` in processes that were killed before they could
+        clean up, and return their paths.
+
+        Only files last modified more than `max_age` seconds ago are removed,
+        so that files still being written by a running job are left alone.
+
+        Parameters:
+            directory: Directory to search, typically a dataset's output directory.
+            max_age: Minimum age, in seconds, of the files to remove.
+        """
+        cutoff = time.time() - max_age
+        removed = []
+        for path in Path(directory).rglob(".*.tmp-*"):
+            # only names of the exact form tmp_to_dst_file creates
+            if not _TMP_NAME.match(path.name):
+                continue
+            try:
+                if path.is_file() and path.stat().st_mtime < cutoff:
+                    path.unlink()
+                    removed.append(path)
+            except OSError:
+                pass
+        return removed
+
+    def cached(
+        self, key: Hashable, loader: Callable[[], Any], per_thread: bool = False
+    ) -> Any:
+        """
+        Return a value from this worker's cache, loading it with `loader`
+        if it isn't cached yet. This lets tasks that run on the same worker
+        share expensive-to-load values, such as opened datasets or parsed
+        arrays, instead of each loading their own. Cached values are shared,
+        so they must not be modified (see `WorkerCache`).
+
+        The cache is local to each worker process and bounded in size by
+        the `cache_max_entries` and `cache_max_bytes` run parameters,
+        evicting the least recently used values first. Keys for values
+        loaded from files should include `file_key(path)`, so that values
+        are reloaded when their file changes.
+
+        Here is an example of its use:
+
+        ```python
+        points = self.cached(("plad", file_key(self.src_path)), self.load_points)
+        ```
+
+        Parameters:
+            key: Hashable key identifying the value.
+            loader: Function called without arguments to load the value.
+            per_thread: If set to `True`, each thread gets its own copy of the value. Use this for values that aren't thread-safe, such as rasterio datasets.
+        """
+        if per_thread:
+            key = (key, threading.get_ident())
+        cache = worker_cache(self.cache_max_entries, self.cache_max_bytes)
+        return cache.get(key, loader)
 
     def error_wrapper(self, func: Callable, args: Dict[str, Any]):
         """
@@ -683,6 +823,9 @@ class Dataset(ABC):
 
         self.bypass_error_wrapper = params.bypass_error_wrapper
 
+        self.cache_max_entries = params.cache_max_entries
+        self.cache_max_bytes = params.cache_max_bytes
+
         # Allow datasets to set their own default max_workers
         if params.max_workers is None and hasattr(self, "max_workers"):
             max_workers = self.max_workers
@@ -0,0 +1,427 @@
+import hashlib
+import math
+import os
+import threading
+from collections.abc import Callable, Sequence
+from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor
+from tempfile import mkstemp
+from typing import List, Optional, Tuple
+
+import numpy as np
+import rasterio
+from affine import Affine
+from rasterio.windows import Window
+
+from .calc import _map_bounded
+from .cog import cog_overview_resampling, compression_profile
+
+EARTH_RADIUS_KM = 6371.0
+"""
+Mean Earth radius used for distances, matching `distancerasters`.
+"""
+
+
+def _unit_vectors(lon: np.ndarray, lat: np.ndarray) -> np.ndarray:
+    lon = np.radians(lon)
+    lat = np.radians(lat)
+    cos_lat = np.cos(lat)
+    return np.column_stack(
+        (
+            (cos_lat * np.cos(lon)).ravel(),
+            (cos_lat * np.sin(lon)).ravel(),
+            np.broadcast_to(np.sin(lat), cos_lat.shape).ravel(),
+        )
+    )
+
+
+def _chord_to_km(chord: np.ndarray) -> np.ndarray:
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.clip(chord / 2, 0, 1))
+
+
+def _km_to_chord(km: float) -> float:
+    return 2 * math.sin(min(km / EARTH_RADIUS_KM, math.pi) / 2)
+
+
+def _edge_cells(mask: np.ndarray) -> np.ndarray:
+    """
+    Source cells with at least one non-source 4-neighbour. Any cell outside
+    a region of source cells is at least as close to one of these as to
+    an interior cell, so they are the only candidates a search needs.
+    Cells on the border of `mask` are always kept, since their neighbours
+    outside of it are unknown.
+    """
+    interior = mask.copy()
+    interior[1:, :] &= mask[:-1, :]
+    interior[:-1, :] &= mask[1:, :]
+    interior[:, 1:] &= mask[:, :-1]
+    interior[:, :-1] &= mask[:, 1:]
+    interior[0, :] = interior[-1, :] = False
+    interior[:, 0] = interior[:, -1] = False
+    return mask & ~interior
+
+
+class _Grid:
+    """
+    Geometry of a north-up raster grid, and reads of its source mask.
+    """
+
+    def __init__(self, read, shape, affine, conditional):
+        self.read = read
+        self.nrows, self.ncols = shape
+        self.affine = affine
+        self.conditional = conditional
+        self.xres = affine.a
+        self.yres = -affine.e
+        # grids spanning every longitude wrap around the antimeridian
+        self.wrap = abs(self.xres * self.ncols - 360) < self.xres / 2
+        self._tree = None
+        self._tree_lock = threading.Lock()
+
+    def lon(self, cols: np.ndarray) -> np.ndarray:
+        return self.affine.c + self.xres * (cols + 0.5)
+
+    def lat(self, rows: np.ndarray) -> np.ndarray:
+        return self.affine.f - self.yres * (rows + 0.5)
+
+    def mask(self, row_start, row_stop, col_start, col_stop) -> np.ndarray:
+        return np.asarray(
+            self.conditional(self.read(row_start, row_stop, col_start, col_stop)),
+            dtype=bool,
+        )
+
+    def col_ranges(self, start: int, stop: int) -> List[Tuple[int, int]]:
+        """
+        Split the column range `[start, stop)` into in-bounds pieces,
+        wrapping around the antimeridian if the grid allows it.
+        """
+        if stop - start >= self.ncols:
+            return [(0, self.ncols)]
+        if not self.wrap:
+            return [(max(0, start), min(self.ncols, stop))]
+        ranges = []
+        if start < 0:
+            ranges.append((self.ncols + start, self.ncols))
+            start = 0
+        if stop > self.ncols:
+            ranges.append((0, stop - self.ncols))
+            stop = self.ncols
+        ranges.append((start, stop))
+        return ranges
+
+    def sources(self, row_start, row_stop, ranges) -> np.ndarray:
+        points = []
+        for col_start, col_stop in ranges:
+            edges = _edge_cells(self.mask(row_start, row_stop, col_start, col_stop))
+            rows, cols = np.nonzero(edges)
+            points.append(
+                _unit_vectors(self.lon(cols + col_start), self.lat(rows + row_start))
+            )
+        return np.concatenate(points)
+
+    def source_tree(self, strip_rows: int):
+        """
+        KD-tree of the source cells of the whole grid, built once from strips
+        of `strip_rows` rows and shared by every tile.
+        """
+        from scipy.spatial import cKDTree
+
+        with self._tree_lock:
+            if self._tree is None:
+                points = [np.empty((0, 3))]
+                for row_start in range(0, self.nrows, strip_rows):
+                    row_stop = min(self.nrows, row_start + strip_rows)
+                    points.append(self.sources(row_start, row_stop, [(0, self.ncols)]))
+                self._tree = cKDTree(np.concatenate(points))
+        return self._tree
+
+
+def _tile_distances(
+    grid: _Grid,
+    window: Window,
+    halo: int,
+    max_halo: int,
+    max_chord: float,
+) -> np.ndarray:
+    """
+    Great circle distance (km) from every cell of `window` to the nearest
+    source cell.
+
+    Sources are searched for in the window padded by `halo` cells. A
+    neighbour found there is only accepted if it is closer than any cell
+    outside of the padded window could be; the rest of the cells are
+    searched again with the padding doubled, until the padded window
+    covers the whole grid or the search radius reaches `max_chord`. Past
+    `max_halo` cells of padding, the remaining cells are searched among
+    the sources of the whole grid at once, rather than every thread
+    holding a mask and tree of an ever larger share of the grid.
+    """
+    from scipy.spatial import cKDTree
+
+    r0, c0 = window.row_off, window.col_off
+    height, width = window.height, window.width
+    rows = np.arange(r0, r0 + height)
+    cols = np.arange(c0, c0 + width)
+
+    distances = np.full(height * width, np.inf)
+    is_source = grid.mask(r0, r0 + height, c0, c0 + width).ravel()
+    distances[is_source] = 0
+    pending = np.flatnonzero(~is_source)
+    if not pending.size:
+        return distances.reshape(height, width)
+
+    lon, lat = np.meshgrid(grid.lon(cols), grid.lat(rows))
+    targets = _unit_vectors(lon, lat)
+
+    pad = halo
+    while pending.size:
+        if pad > max_halo:
+            found, _ = grid.source_tree(height).query(
+                targets[pending], distance_upper_bound=max_chord
+            )
+            distances[pending] = found
+            break
+
+        row_start = max(0, r0 - pad)
+        row_stop = min(grid.nrows, r0 + height + pad)
+        ranges = grid.col_ranges(c0 - pad, c0 + width + pad)
+        full_width = ranges == [(0, grid.ncols)]
+        complete = full_width and row_start == 0 and row_stop == grid.nrows
+
+        # lower bound on the chord length to any cell outside the padded window
+        if complete:
+            bound = np.inf
+        else:
+            bound = 2.0
+            pad_north = r0 - row_start if row_start > 0 else np.inf
+            pad_south = row_stop - r0 - height if row_stop < grid.nrows else np.inf
+            pad_rows = min(pad_north, pad_south)
+            if np.isfinite(pad_rows):
+                arc = math.radians(min(pad_rows * grid.yres, 180))
+                bound = min(bound, 2 * math.sin(arc / 2))
+            clipped = c0 - pad <= 0 and c0 + width + pad >= grid.ncols
+            if not full_width and (grid.wrap or not clipped):
+                pole_lat = max(
+                    abs(grid.affine.f - grid.yres * row_start),
+                    abs(grid.affine.f - grid.yres * row_stop),
+                )
+                cos_lat = math.cos(math.radians(min(pole_lat, 90)))
+                arc = math.radians(min(pad * grid.xres, 180))
+                bound = min(bound, 2 * cos_lat * math.sin(arc / 2))
+        search = min(bound, max_chord)
+
+        sources = grid.sources(row_start, row_stop, ranges)
+        if len(sources):
+            found, _ = cKDTree(sources).query(
+                targets[pending], distance_upper_bound=search
+            )
+            # cKDTree only returns neighbours strictly closer than the bound
+            hit = np.isfinite(found)
+            distances[pending[hit]] = found[hit]
+            pending = pending[~hit]
+
+        if complete or bound >= max_chord:
+            break
+        pad *= 2
+
+    hit = np.isfinite(distances) & (distances > 0)
+    distances[hit] = _chord_to_km(distances[hit])
+    return distances.reshape(height, width)
+
+
+def distance_raster(
+    source: np.ndarray | str | os.PathLike,
+    dst_path: str | os.PathLike,
+    affine: Optional[Affine] = None,
+    conditional: Optional[Callable[[np.ndarray], np.ndarray]] = None,
+    tile_size: int = 1024,
+    halo: int = 128,
+    max_halo: int = 2048,
+    max_distance: Optional[float] = None,
+    max_workers: Optional[int] = None,
+    nodata: float = -9999,
+    dtype: str = "float64",
+    categorical: Optional[bool] = None,
+    crs: str = "EPSG:4326",
+    scratch_dir: Optional[str | os.PathLike] = None,
+) -> None:
+    """
+    Build a Cloud Optimized GeoTIFF of the great circle distance, in
+    kilometers, from every cell of a grid to the nearest source cell.
+
+    Distances are measured between cell centroids on a sphere, the same as
+    `distancerasters.DistanceRaster`, but instead of one search over the
+    whole grid in memory the grid is processed in tiles on a thread pool.
+    Each tile only searches the sources in a halo around it, growing the
+    halo only for cells whose nearest source could lie outside of it, so
+    the nearest source found is always exact. Finished tiles are streamed
+    to an intermediate tiled GeoTIFF in local scratch space as they
+    complete, only a few tiles ahead of the writes, before being translated
+    into a COG.
+
+    Parameters:
+        source: 2D array (may be a memory map) or path of a single band raster to find sources in.
+        dst_path: Path to write the distance COG to.
+        affine: Transform of `source`. Required when `source` is an array, read from the file otherwise.
+        conditional: Function mapping a block of `source` to a boolean mask of its source cells. Defaults to `source == 1`.
+        tile_size: Width and height of each tile, in cells. Must be a multiple of 16.
+        halo: Initial padding, in cells, around each tile to search for sources in.
+        max_halo: Largest padding, in cells, around each tile to search for sources in. Cells whose nearest source could be further away are searched for among the sources of the whole grid, which are indexed once.
+        max_distance: Optional search radius in kilometers. Cells with no source within it are set to `nodata`.
+        max_workers: Number of threads processing tiles. Defaults to the number of CPU cores.
+        nodata: Nodata value of the output, used for cells with no source in range.
+        dtype: Data type of the output.
+        categorical: Whether the output's values are categories, see `cog_overview_resampling`. Defaults to guessing from `dtype`.
+        crs: Coordinate reference system of `source`, used when it is an array.
+        scratch_dir: Directory of the intermediate GeoTIFF, which should be on fast local storage. Defaults to the system's temporary directory.
+    """
+    from rio_cogeo.cogeo import cog_translate
+    from rio_cogeo.profiles import cog_profiles
+
+    if tile_size % 16:
+        raise ValueError(f"tile_size must be a multiple of 16, got {tile_size}")
+    if conditional is None:
+        conditional = lambda rarray: rarray == 1  # noqa: E731
+
+    if isinstance(source, np.ndarray):
+        if affine is None:
+            raise ValueError("affine must be given when source is an array")
+        shape = source.shape
+
+        def read(row_start, row_stop, col_start, col_stop):
+            return source[row_start:row_stop, col_start:col_stop]
+
+    else:
+        with rasterio.open(source) as src:
+            affine = src.transform
+            crs = src.crs
+            shape = src.shape
+
+        def read(row_start, row_stop, col_start, col_stop):
+            # each tile reads from its own thread, so use a handle per read
+            with rasterio.open(source) as tile_src:
+                return tile_src.read(
+                    1,
+                    window=Window.from_slices(
+                        (row_start, row_stop), (col_start, col_stop)
+                    ),
+                )
+
+    if affine.b != 0 or affine.d != 0 or affine.e >= 0:
+        raise ValueError("Distance rasters require a north-up grid")
+
+    grid = _Grid(read, shape, affine, conditional)
+    max_chord = np.inf if max_distance is None else _km_to_chord(max_distance)
+
+    windows = [
+        Window(col, row, min(tile_size, grid.ncols - col), min(tile_size, grid.nrows - row))
+        for row in range(0, grid.nrows, tile_size)
+        for col in range(0, grid.ncols, tile_size)
+    ]
+
+    profile = {
+        "driver": "GTiff",
+        "dtype": dtype,
+        "count": 1,
+        "height": grid.nrows,
+        "width": grid.ncols,
+        "crs": crs,
+        "transform": affine,
+        "nodata": nodata,
+        "tiled": True,
+        "blockxsize": tile_size,
+        "blockysize": tile_size,
+        "compress": "LZW",
+        "BIGTIFF": "IF_SAFER",
+    }
+
+    def tile_distances(window: Window) -> np.ndarray:
+        return _tile_distances(grid, window, halo, max_halo, max_chord)
+
+    max_workers = max_workers or os.cpu_count()
+    fd, tiles_path = mkstemp(suffix=".tiles.tif", dir=scratch_dir)
+    os.close(fd)
+    try:
+        with rasterio.open(tiles_path, "w", **profile) as dst, ThreadPoolExecutor(
+            max_workers
+        ) as pool:
+            for window, data in _map_bounded(
+                pool, tile_distances, windows, 2 * max_workers
+            ):
+                data[~np.isfinite(data)] = nodata
+                dst.write(data.astype(dtype), 1, window=window)
+
+        dst_profile = cog_profiles.get("lzw")
+        dst_profile.update(compression_profile(dtype, categorical, driver="GTiff"))
+        cog_translate(
+            tiles_path,
+            dst_path,
+            dst_profile,
+            overview_resampling=cog_overview_resampling(dtype, categorical),
+            in_memory=False,
+            quiet=True,
+            config={"GDAL_NUM_THREADS": "ALL_CPUS"},
+        )
+    finally:
+        if os.path.exists(tiles_path):
+            os.remove(tiles_path)
+
+
+def _source_files(sources: Sequence[str | os.PathLike]) -> List[Path]:
+    files = []
+    for source in sources:
+        source = Path(source)
+        if source.suffix.lower() == ".shp":
+            # a shapefile is spread across files sharing its stem
+            files.extend(sorted(source.parent.glob(f"{source.stem}.*")))
+        else:
+            files.append(source)
+    return files
+
+
+def cached_source_raster(
+    cache_dir: str | os.PathLike,
+    sources: Sequence[str | os.PathLike],
+    build: Callable[[], np.ndarray],
+    dtype: str = "uint8",
+    key: str = "",
+) -> np.ndarray:
+    """
+    Build a raster from vector sources once, and reuse it from an on-disk
+    cache on later runs.
+
+    The cache is keyed by a hash of the contents of every source file (all
+    the files of a shapefile) and `key`, so it is rebuilt whenever a source
+    changes. Cached rasters are stored uncompressed and returned as a
+    read-only memory map, which `distance_raster` can read tiles from
+    without loading the whole grid into memory.
+
+    Parameters:
+        cache_dir: Directory to store cached rasters in.
+        sources: Paths of the files `build` reads from.
+        build: Function returning the raster as a 2D array, called on a cache miss.
+        dtype: Data type to store the raster as.
+        key: Extra text to key the cache by, e.g. the grid the sources are rasterized to.
+
+    Returns:
+        The raster, as a read-only memory-mapped array.
+    """
+    digest = hashlib.sha256(key.encode())
+    for path in _source_files(sources):
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b""):
+                digest.update(chunk)
+
+    cache_dir = Path(cache_dir)
+    cache_path = cache_dir / f"{digest.hexdigest()}.npy"
+    if not cache_path.exists():
+        cache_dir.mkdir(parents=True, exist_ok=True)
+        fd, tmp_path = mkstemp(dir=cache_dir, suffix=".npy")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                np.save(f, np.asarray(build(), dtype=dtype))
+            os.replace(tmp_path, cache_path)
+        except BaseException:
+            os.remove(tmp_path)
+            raise
+    return np.load(cache_path, mmap_mode="r")
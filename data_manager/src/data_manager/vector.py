@@ -0,0 +1,246 @@
+import itertools
+import os
+from collections.abc import Iterable, Iterator, Sequence
+from typing import TYPE_CHECKING, Optional, Tuple
+
+if TYPE_CHECKING:
+    import geopandas as gpd
+
+Bounds = Tuple[float, float, float, float]
+
+
+def sql_in(field: str, values: Sequence[str]) -> str:
+    """
+    Build an OGR SQL `where` clause selecting features whose `field` is one
+    of `values`, e.g. `sql_in("IUCN_CAT", ["Ia", "Ib"])`.
+    """
+    quoted = ", ".join("'" + str(v).replace("'", "''") + "'" for v in values)
+    return f'"{field}" IN ({quoted})'
+
+
+def read_vector(
+    path: str | os.PathLike,
+    layer: Optional[str | int] = None,
+    columns: Optional[Sequence[str]] = None,
+    where: Optional[str] = None,
+    bbox: Optional[Bounds] = None,
+    read_geometry: bool = True,
+    **kwargs,
+) -> "gpd.GeoDataFrame":
+    """
+    Read features from a vector source into a GeoDataFrame, with filtering
+    done by OGR as the source is read rather than in pandas afterwards.
+
+    Attribute filters (`where`), spatial filters (`bbox`) and column
+    selection (`columns`) are all pushed down to OGR through pyogrio, so
+    features and fields that aren't needed are never decoded. Features are
+    transferred through Arrow.
+
+    Parameters:
+        path: Path of the vector source, may be a GDAL virtual path (e.g. `/vsizip/`).
+        layer: Name or index of the layer to read. Defaults to the first layer.
+        columns: Attribute fields to read. Defaults to all of them, an empty list reads none.
+        where: OGR SQL `WHERE` clause to filter features by, see `sql_in`.
+        bbox: `(xmin, ymin, xmax, ymax)` bounds, in the source CRS, features must intersect.
+        read_geometry: If set to `False`, only attributes are read.
+        kwargs: Passed on to `pyogrio.read_dataframe`.
+
+    Returns:
+        The selected features.
+    """
+    import pyogrio
+
+    return pyogrio.read_dataframe(
+        path,
+        layer=layer,
+        columns=columns,
+        where=where,
+        bbox=bbox,
+        read_geometry=read_geometry,
+        use_arrow=True,
+        **kwargs,
+    )
+
+
+def iter_vector(
+    path: str | os.PathLike,
+    layer: Optional[str | int] = None,
+    columns: Optional[Sequence[str]] = None,
+    where: Optional[str] = None,
+    bbox: Optional[Bounds] = None,
+    batch_size: int = 65536,
+) -> Iterator["gpd.GeoDataFrame"]:
+    """
+    Stream features from a vector source in GeoDataFrames of up to
+    `batch_size` features, so that a whole layer never has to be held in
+    memory at once.
+
+    Filtering is pushed down to OGR the same way as `read_vector`, and
+    batches are read from a single Arrow stream.
+
+    Parameters:
+        path: Path of the vector source, may be a GDAL virtual path (e.g. `/vsizip/`).
+        layer: Name or index of the layer to read. Defaults to the first layer.
+        columns: Attribute fields to read. Defaults to all of them, an empty list reads none.
+        where: OGR SQL `WHERE` clause to filter features by, see `sql_in`.
+        bbox: `(xmin, ymin, xmax, ymax)` bounds, in the source CRS, features must intersect.
+        batch_size: Maximum number of features in each batch.
+
+    Yields:
+        GeoDataFrames of consecutive features.
+    """
+    import geopandas as gpd
+    import pyarrow as pa
+    import shapely
+    from pyogrio.raw import open_arrow
+
+    with open_arrow(
+        path,
+        layer=layer,
+        columns=columns,
+        where=where,
+        bbox=bbox,
+        batch_size=batch_size,
+        use_pyarrow=True,
+    ) as (meta, reader):
+        geometry_name = meta["geometry_name"] or "wkb_geometry"
+        for record_batch in reader:
+            table = pa.Table.from_batches([record_batch])
+            attributes = table.select(
+                [c for c in table.column_names if c != geometry_name]
+            ).to_pandas()
+            geometry = shapely.from_wkb(
+                table.column(geometry_name).to_numpy(zero_copy_only=False)
+            )
+            yield gpd.GeoDataFrame(attributes, geometry=geometry, crs=meta["crs"])
+
+
+def _geoparquet_metadata(gdf: "gpd.GeoDataFrame") -> bytes:
+    """
+    GeoParquet file metadata for a table of WKB-encoded `gdf` geometries.
+    """
+    import json
+
+    column = {"encoding": "WKB", "geometry_types": []}
+    if gdf.crs is not None:
+        column["crs"] = gdf.crs.to_json_dict()
+    return json.dumps(
+        {
+            "version": "1.0.0",
+            "primary_column": gdf.geometry.name,
+            "columns": {gdf.geometry.name: column},
+        }
+    ).encode()
+
+
+def write_vector(
+    gdf: "gpd.GeoDataFrame",
+    path: str | os.PathLike,
+    layer: Optional[str] = None,
+    driver: str = "GPKG",
+    append: bool = False,
+    geoparquet_path: Optional[str | os.PathLike] = None,
+    **kwargs,
+):
+    """
+    Write a GeoDataFrame to a vector file in a single bulk load.
+
+    Features are written through pyogrio and Arrow in one transaction. When
+    a new layer is created, GDAL builds its spatial index once all features
+    are inserted rather than updating it feature by feature.
+
+    Parameters:
+        gdf: Features to write.
+        path: Path of the file to write.
+        layer: Name of the layer to write. Defaults to the file name.
+        driver: OGR driver to write with.
+        append: If set to `True`, features are added to an existing layer.
+        geoparquet_path: If given, the features are also written to this path as GeoParquet.
+        kwargs: Passed on to `pyogrio.write_dataframe`.
+    """
+    import pyogrio
+
+    pyogrio.write_dataframe(
+        gdf,
+        path,
+        layer=layer,
+        driver=driver,
+        append=append,
+        use_arrow=True,
+        **kwargs,
+    )
+    if geoparquet_path is not None:
+        gdf.to_parquet(geoparquet_path)
+
+
+def write_vector_batches(
+    batches: Iterable["gpd.GeoDataFrame"],
+    path: str | os.PathLike,
+    layer: Optional[str] = None,
+    driver: str = "GPKG",
+    geoparquet_path: Optional[str | os.PathLike] = None,
+) -> int:
+    """
+    Write GeoDataFrames of features to a new vector layer as they are
+    produced, so that the whole layer never has to be held in memory.
+
+    Batches are streamed to OGR in a single Arrow write: one transaction for
+    the whole layer, with its spatial index built once at the end. Every
+    batch must have the same columns and types as the first.
+
+    Parameters:
+        batches: GeoDataFrames of features to write, in order.
+        path: Path of the file to write.
+        layer: Name of the layer to write. Defaults to the file name.
+        driver: OGR driver to write with.
+        geoparquet_path: If given, the features are also written to this path as GeoParquet.
+
+    Returns:
+        The number of features written.
+    """
+    import pyogrio
+
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    batches = iter(batches)
+    first = next(batches, None)
+    if first is None:
+        return 0
+
+    schema = pa.table(first.to_arrow(geometry_encoding="WKB")).schema
+    geometry_types = first.geom_type.dropna().unique()
+    parquet = None
+    if geoparquet_path is not None:
+        parquet = pq.ParquetWriter(
+            geoparquet_path,
+            schema.with_metadata({b"geo": _geoparquet_metadata(first)}),
+        )
+
+    count = 0
+
+    def record_batches():
+        nonlocal count
+        for gdf in itertools.chain([first], batches):
+            table = pa.table(gdf.to_arrow(geometry_encoding="WKB")).cast(schema)
+            if parquet is not None:
+                parquet.write_table(table)
+            count += len(gdf)
+            yield from table.to_batches()
+
+    try:
+        pyogrio.write_arrow(
+            pa.RecordBatchReader.from_batches(schema, record_batches()),
+            path,
+            layer=layer,
+            driver=driver,
+            geometry_name=first.geometry.name,
+            geometry_type=(
+                geometry_types[0] if len(geometry_types) == 1 else "Unknown"
+            ),
+            crs=first.crs.to_wkt() if first.crs is not None else None,
+        )
+    finally:
+        if parquet is not None:
+            parquet.close()
+    return count
@@ -9,13 +9,19 @@ dataset from the data export tool and place the CSV in raw_dir before running.
 https://acleddata.com/data-export-tool/
 """
 import json
+from contextlib import ExitStack
 from pathlib import Path
 
 import geopandas as gpd
 import pandas as pd
 from pydantic import field_validator
 
-from data_manager import BaseDatasetConfiguration, Dataset, get_config
+from data_manager import (
+    BaseDatasetConfiguration,
+    Dataset,
+    get_config,
+    write_vector_batches,
+)
 
 FILTER_INGEST_TEMPLATE = Path(__file__).parent / "acled_filter_ingest.json"
 
@@ -84,6 +90,10 @@ class ACLEDConfiguration(BaseDatasetConfiguration):
     raw_dir: str
     output_dir: str
     overwrite_process: bool
+    # number of events read from the CSV and written to the GPKG at a time
+    chunk_size: int = 100000
+    # also write the events to a GeoParquet file next to the GPKG
+    write_geoparquet: bool = False
 
     @field_validator("raw_dir", "output_dir")
     @classmethod
@@ -100,6 +110,8 @@ class ACLED(Dataset):
         self.raw_dir = config.raw_dir
         self.output_dir = config.output_dir
         self.overwrite_process = config.overwrite_process
+        self.chunk_size = config.chunk_size
+        self.write_geoparquet = config.write_geoparquet
 
     def find_csv(self) -> Path:
         logger = self.get_logger()
@@ -114,14 +126,25 @@ class ACLED(Dataset):
             logger.warning(f"Multiple CSVs in {self.raw_dir}; using most recent: {csvs[-1].name}")
         return csvs[-1]
 
-    def load_data(self) -> pd.DataFrame:
-        logger = self.get_logger()
-        csv_path = self.find_csv()
-        logger.info(f"Loading {csv_path}")
-        df = pd.read_csv(csv_path, low_memory=False)
-        df["event_count"] = 1
-        logger.info(f"Loaded {len(df):,} events")
-        return df
+    def read_chunks(self, csv_path, columns):
+        """
+        Stream the CSV in typed chunks of `chunk_size` events, each with
+        the synthetic `event_count = 1` column added
+        """
+        # nullable integers, so a chunk with missing values has the same
+        # column types as every other chunk
+        dtype = {
+            f: "Int64" for f in ["year", "geo_precision", "time_precision", "fatalities"]
+        }
+        dtype.update(latitude="float64", longitude="float64")
+        for chunk in pd.read_csv(
+            csv_path,
+            usecols=[c for c in columns if c != "event_count"],
+            dtype=dtype,
+            chunksize=self.chunk_size,
+        ):
+            chunk["event_count"] = 1
+            yield chunk[columns]
 
     def process(self):
         logger = self.get_logger()
@@ -131,17 +154,20 @@ class ACLED(Dataset):
             logger.info(f"Output exists, skipping: {output_path}")
             return None
 
+        csv_path = self.find_csv()
+        header = pd.read_csv(csv_path, nrows=0).columns
+
         required_cols = [
             f for f, props in FIELD_DICT.items()
             if not props["optional"] and f != "event_count"
         ]
-        missing = [c for c in required_cols if c not in self.df.columns]
+        missing = [c for c in required_cols if c not in header]
         if missing:
             raise ValueError(f"CSV missing required columns: {missing}")
 
         present_optional = [
             f for f, props in FIELD_DICT.items()
-            if props["optional"] and f in self.df.columns
+            if props["optional"] and f in header
         ]
         if present_optional:
             logger.info(f"Optional columns present: {present_optional}")
@@ -155,22 +181,57 @@ class ACLED(Dataset):
         seen = set()
         keep_cols = [c for c in keep_cols if not (c in seen or seen.add(c))]
 
-        gdf = gpd.GeoDataFrame(
-            self.df[keep_cols].copy(),
-            geometry=gpd.points_from_xy(self.df.longitude, self.df.latitude),
-            crs="EPSG:4326",
-        )
+        # filter values are gathered chunk by chunk, see update_filter_ingest
+        stats = {
+            f: set() if props["filter_type"] == "categorical" else [None, None]
+            for f, props in FIELD_DICT.items()
+            if "filters" in props["types"] and f in keep_cols
+        }
 
-        logger.info(f"Writing {output_path} ({len(gdf):,} events)")
-        with self.tmp_to_dst_file(output_path, make_dst_dir=True) as tmp:
-            gdf.to_file(tmp, layer="acled", driver="GPKG")
+        logger.info(f"Writing {output_path} from {csv_path}")
+
+        def batches():
+            for chunk in self.read_chunks(csv_path, keep_cols):
+                for field, values in stats.items():
+                    if isinstance(values, set):
+                        values.update(chunk[field].dropna().unique().tolist())
+                    else:
+                        lo, hi = chunk[field].min(), chunk[field].max()
+                        if not pd.isna(lo):
+                            values[0] = lo if values[0] is None else min(values[0], lo)
+                            values[1] = hi if values[1] is None else max(values[1], hi)
+
+                yield gpd.GeoDataFrame(
+                    chunk,
+                    geometry=gpd.points_from_xy(chunk.longitude, chunk.latitude),
+                    crs="EPSG:4326",
+                )
 
-        return gdf
+        parquet_path = output_path.with_suffix(".parquet")
+        with ExitStack() as stack:
+            tmp = stack.enter_context(
+                self.tmp_to_dst_file(output_path, make_dst_dir=True)
+            )
+            tmp_parquet = (
+                stack.enter_context(self.tmp_to_dst_file(parquet_path))
+                if self.write_geoparquet
+                else None
+            )
+            count = write_vector_batches(
+                batches(), tmp, layer="acled", geoparquet_path=tmp_parquet
+            )
+            # raising here discards the empty temporary files instead of
+            # moving them into place
+            if not count:
+                raise ValueError(f"No events found in {csv_path}")
+        logger.info(f"Wrote {output_path} ({count:,} events)")
+
+        return stats
 
     def update_filter_ingest(self):
         logger = self.get_logger()
 
-        if self.gdf is None:
+        if self.stats is None:
             logger.info("Output exists and overwrite_process=false; leaving filter_ingest as-is")
             return
 
@@ -188,7 +249,7 @@ class ACLED(Dataset):
         for field, props in FIELD_DICT.items():
             if "filters" not in props["types"]:
                 continue
-            if field not in self.gdf.columns:
+            if field not in self.stats:
                 continue
             field_dict = {
                 "display": props["display"],
@@ -196,12 +257,10 @@ class ACLED(Dataset):
                 "type": props["filter_type"],
             }
             if props["filter_type"] == "categorical":
-                field_dict["categories"] = sorted(
-                    self.gdf[field].dropna().unique().tolist()
-                )
+                field_dict["categories"] = sorted(self.stats[field])
             elif props["filter_type"] == "range":
-                field_dict["min"] = int(self.gdf[field].min())
-                field_dict["max"] = int(self.gdf[field].max())
+                field_dict["min"] = int(self.stats[field][0])
+                field_dict["max"] = int(self.stats[field][1])
             filter_ingest["other"]["filters"][field] = field_dict
 
         logger.info(f"Writing {FILTER_INGEST_TEMPLATE}")
@@ -212,11 +271,8 @@ class ACLED(Dataset):
     def main(self):
         logger = self.get_logger()
 
-        logger.info("Loading data...")
-        self.df = self.load_data()
-
         logger.info("Processing...")
-        self.gdf = self.process()
+        self.stats = self.process()
 
         logger.info("Updating ingest JSON...")
         self.update_filter_ingest()
@@ -18,7 +18,6 @@ from pathlib import Path
 from urllib.parse import quote
 from zipfile import ZipFile
 
-import geopandas as gpd
 import pandas as pd
 import requests
 from pydantic import field_validator
@@ -26,7 +25,7 @@ from shapely.geometry import mapping, shape
 from shapely.geometry.multipolygon import MultiPolygon
 from shapely.ops import unary_union
 
-from data_manager import BaseDatasetConfiguration, Dataset, get_config
+from data_manager import BaseDatasetConfiguration, Dataset, get_config, read_vector
 
 AREA_TABLE_URL = "http://atlasofurbanexpansion.org/file-manager/userfiles/data_page/Areas_and_Densities_Tables/Areas_and_Densities_Table_1.csv"
 ROAD_TABLE_URL = "http://atlasofurbanexpansion.org/file-manager/userfiles/data_page/Blocks_and_Roads_Tables/Blocks_and_Roads_Table_1.csv"
@@ -187,7 +186,8 @@ class AtlasOfUrbanExpansion(Dataset):
         if not shp_path.exists():
             return None
 
-        gdf = gpd.read_file(shp_path)
+        # only the boundary geometry is needed, not its attributes
+        gdf = read_vector(shp_path, columns=[])
         if gdf.crs is not None and gdf.crs.to_epsg() != 4326:
             gdf = gdf.to_crs(epsg=4326)
 
@@ -27,12 +27,19 @@ to multiple cores. This can be run on SciClone's Hima nodes using the following
 """
 
 import gzip
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 from urllib import parse, request
 
 import numpy as np
 import rasterio
-from data_manager import BaseDatasetConfiguration, Dataset, get_config
+from data_manager import (
+    BaseDatasetConfiguration,
+    Dataset,
+    aggregate_rasters,
+    aggregate_stack,
+    get_config,
+)
 
 
 class CRU_TS_Configuration(BaseDatasetConfiguration):
@@ -45,6 +52,13 @@ class CRU_TS_Configuration(BaseDatasetConfiguration):
     overwrite_download: bool
     overwrite_unzip: bool
     overwrite_processing: bool
+    # build monthly and yearly outputs in one pass over the NetCDF (see
+    # CRU_TS.run_var_data) instead of re-reading monthly COGs per method
+    single_pass: bool = True
+    # number of years of monthly bands to read from the NetCDF at a time
+    slab_years: int = 10
+    # threads used to write output COGs while the next slab is read
+    write_threads: int = 4
 
 
 class CRU_TS(Dataset):
@@ -72,6 +86,10 @@ class CRU_TS(Dataset):
         self.overwrite_unzip = config.overwrite_unzip
         self.overwrite_process = config.overwrite_processing
 
+        self.single_pass = config.single_pass
+        self.slab_years = config.slab_years
+        self.write_threads = config.write_threads
+
         self.years = range(int(config.start_year), int(config.end_year) + 1)
         self.months = range(1, 13)
 
@@ -165,78 +183,30 @@ class CRU_TS(Dataset):
             with rasterio.open(dst_path, "w", **meta) as dst:
                 dst.write(np.array([data]))
 
-    def aggregate_rasters(self, file_list, method="mean"):
-        """Aggregate multiple rasters
-
-        Aggregates multiple rasters with same features (dimensions, transform,
-        pixel size, etc.) and creates single layer using aggregation method
-        specified.
-
-        Supported methods: mean (default), max, min, sum
-
-        Arguments
-            file_list (list): list of file paths for rasters to be aggregated
-            method (str): method used for aggregation
-
-        Return
-            result: rasterio Raster instance
-        """
-        logger = self.get_logger()
-        store = None
-        for ix, file_path in enumerate(file_list):
-            try:
-                raster = rasterio.open(file_path)
-            except:
-                logger.error(f"Could not include file in aggregation ({file_path})")
-                continue
-            active = raster.read(masked=True)
-            if store is None:
-                store = active.copy()
-            else:
-                # make sure dimensions match
-                if active.shape != store.shape:
-                    raise Exception("Dimensions of rasters do not match")
-                if method == "max":
-                    store = np.ma.array((store, active)).max(axis=0)
-                    # non masked array alternatives
-                    # store = np.maximum.reduce([store, active])
-                    # store = np.vstack([store, active]).max(axis=0)
-                elif method == "mean":
-                    if ix == 1:
-                        weights = (~store.mask).astype(int)
-                    store = np.ma.average(
-                        np.ma.array((store, active)),
-                        axis=0,
-                        weights=[weights, (~active.mask).astype(int)],
-                    )
-                    weights += (~active.mask).astype(int)
-                elif method == "min":
-                    store = np.ma.array((store, active)).min(axis=0)
-                elif method == "sum":
-                    store = np.ma.array((store, active)).sum(axis=0)
-                else:
-                    raise Exception("Invalid method")
-        store = store.filled(raster.nodata)
-        return store, raster.profile
-
-    def run_yearly_data(self, year, method, var):
+    def run_yearly_data(self, year, var):
         logger = self.get_logger()
-        logger.info(f"Running: {var}, {method}, {str(year)}")
+        logger.info(f"Running: {var}, {str(year)}")
         src_base = self.output_dir / "monthly" / var
-        dst_base = self.output_dir / "yearly" / var / method
+        # hidden files are writes still in progress, see tmp_to_dst_file
         year_files = sorted(
-            [i for i in src_base.iterdir() if f"cru.{var}.{year}" in i.name]
+            [
+                i
+                for i in src_base.iterdir()
+                if f"cru.{var}.{year}" in i.name and not i.name.startswith(".")
+            ]
         )
-        year_mask = f"cru.{var}.YYYY.tif"
-        year_path = dst_base / year_mask.replace("YYYY", str(year))
-        # aggregate
-        data, meta = self.aggregate_rasters(year_files, method)
-        # write geotiff
-        meta["dtype"] = data.dtype
-        meta["driver"] = "COG"
-        meta["compress"] = "lzw"
-        with rasterio.open(year_path, "w", **meta) as result:
-            result.write(data)
+        # aggregate with every method from a single read of the year's months
+        results, meta = aggregate_rasters(year_files, self.method_list)
+        for method, data in results.items():
+            year_path = (
+                self.output_dir / "yearly" / var / method / f"cru.{var}.{year}.tif"
+            )
+            # write geotiff
+            meta["dtype"] = data.dtype
+            meta["driver"] = "COG"
+            meta["compress"] = "lzw"
+            with rasterio.open(year_path, "w", **meta) as result:
+                result.write(data, 1)
 
     def run_monthly_data(self, var):
         logger = self.get_logger()
@@ -256,6 +226,91 @@ class CRU_TS(Dataset):
 
         src.close()
 
+    def write_layer(self, data, out_path, meta):
+        """write a single band array to out_path"""
+        with self.tmp_to_dst_file(out_path) as dst_path:
+            with rasterio.open(dst_path, "w", **meta) as dst:
+                dst.write(data, 1)
+
+    def run_var_data(self, var):
+        """Extract monthly COGs and build yearly aggregates in a single pass
+
+        The NetCDF is read in slabs of `self.slab_years` years of monthly
+        bands. Each month of a slab is written to a COG on a thread pool,
+        and every method in `self.method_list` is computed for each year
+        from the in-memory slab, so monthly outputs are never read back in.
+        """
+        logger = self.get_logger()
+
+        logger.info(f"Running variable: {var}")
+        month_dir = self.output_dir / "monthly" / var
+        month_dir.mkdir(parents=True, exist_ok=True)
+        in_path = f"netcdf:{self.raw_dir.as_posix()}/cru_ts{self.cru_version}.{self.start_year}.{self.end_year}.{var}.dat.nc:{var}"
+
+        years = list(self.years)
+
+        with rasterio.open(in_path) as src, ThreadPoolExecutor(
+            max_workers=self.write_threads
+        ) as pool:
+            meta = {
+                "count": 1,
+                "crs": {"init": "epsg:4326"},
+                "dtype": src.meta["dtype"],
+                "transform": src.meta["transform"],
+                "driver": "COG",
+                "height": src.meta["height"],
+                "width": src.meta["width"],
+                "nodata": src.meta["nodata"],
+                "compress": "lzw",
+            }
+
+            pending = []
+            for i in range(0, len(years), self.slab_years):
+                slab_years = years[i : i + self.slab_years]
+                logger.debug(f"reading {var} slab {slab_years[0]}-{slab_years[-1]}")
+                first_band = (slab_years[0] - self.start_year) * 12 + 1
+                bands = list(range(first_band, first_band + len(slab_years) * 12))
+                slab = src.read(bands, masked=True)
+
+                futures = []
+                for ix, band in enumerate(bands):
+                    _, temporal = self.band_temporal_list[band - 1]
+                    out_path = month_dir / f"cru.{var}.{temporal}.tif"
+                    futures.append(
+                        pool.submit(self.write_layer, slab.data[ix], out_path, meta)
+                    )
+
+                for yx, year in enumerate(slab_years):
+                    year_stack = slab[yx * 12 : (yx + 1) * 12]
+                    results = aggregate_stack(year_stack, self.method_list)
+                    for method, data in results.items():
+                        year_meta = dict(meta, dtype=data.dtype)
+                        year_path = (
+                            self.output_dir
+                            / "yearly"
+                            / var
+                            / method
+                            / f"cru.{var}.{year}.tif"
+                        )
+                        year_path.parent.mkdir(parents=True, exist_ok=True)
+                        futures.append(
+                            pool.submit(
+                                self.write_layer,
+                                data.filled(meta["nodata"]),
+                                year_path,
+                                year_meta,
+                            )
+                        )
+
+                # let this slab's writes overlap with reading the next one,
+                # but don't let more than two slabs pile up in memory
+                for f in pending:
+                    f.result()
+                pending = futures
+
+            for f in pending:
+                f.result()
+
     def main(self):
         logger = self.get_logger()
 
@@ -265,6 +320,12 @@ class CRU_TS(Dataset):
         dl_results = self.run_tasks(self.download, var_tasks)
         self.log_run(dl_results)
 
+        if self.single_pass:
+            logger.info("Processing Monthly and Yearly Data")
+            var_results = self.run_tasks(self.run_var_data, var_tasks)
+            self.log_run(var_results)
+            return
+
         logger.info("Processing Monthly Data")
         monthly_results = self.run_tasks(self.run_monthly_data, var_tasks)
         self.log_run(monthly_results)
@@ -276,8 +337,8 @@ class CRU_TS(Dataset):
             for method in self.method_list:
                 dst_base = self.output_dir / "yearly" / var / method
                 dst_base.mkdir(parents=True, exist_ok=True)
-                for year in self.years:
-                    qlist.append([year, method, var])
+            for year in self.years:
+                qlist.append([year, var])
 
         yearly_results = self.run_tasks(self.run_yearly_data, qlist)
         self.log_run(yearly_results)
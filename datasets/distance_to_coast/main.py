@@ -7,7 +7,13 @@ from zipfile import ZipFile
 import distancerasters as dr
 import requests
 from affine import Affine
-from data_manager import BaseDatasetConfiguration, Dataset, get_config
+from data_manager import (
+    BaseDatasetConfiguration,
+    Dataset,
+    cached_source_raster,
+    distance_raster,
+    get_config,
+)
 
 
 class DISTANCE_TO_COAST_Configuration(BaseDatasetConfiguration):
@@ -27,6 +33,10 @@ class DISTANCE_TO_COAST_Configuration(BaseDatasetConfiguration):
     overwrite_extract: bool
     overwrite_binary_raster: bool
     overwrite_distance_raster: bool
+    # width and height, in pixels, of the tiles distances are computed in
+    distance_tile_size: int = 1024
+    # threads computing distance tiles, 0 uses all cores
+    distance_workers: int = 0
 
 
 class DISTANCE_TO_COAST(Dataset):
@@ -50,6 +60,9 @@ class DISTANCE_TO_COAST(Dataset):
         self.overwrite_binary_raster = config.overwrite_binary_raster
         self.overwrite_distance_raster = config.overwrite_distance_raster
 
+        self.distance_tile_size = config.distance_tile_size
+        self.distance_workers = config.distance_workers or os.cpu_count()
+
     def raster_conditional(self, rarray):
         return rarray == 1
 
@@ -134,8 +147,15 @@ class DISTANCE_TO_COAST(Dataset):
         ymax = 90
         affine = Affine(pixel_size, 0, xmin, 0, -pixel_size, ymax)
         shape = (int((ymax - ymin) / pixel_size), int((xmax - xmin) / pixel_size))
-        borders_path = str(self.raw_dir) + "/GSHHS_f_L1.shp"
-        borders, _ = dr.rasterize(borders_path, affine=affine, shape=shape)
+        borders_path = self.raw_dir / "GSHHS_f_L1.shp"
+
+        def rasterize_borders():
+            return cached_source_raster(
+                self.raw_dir / "cache",
+                [borders_path],
+                lambda: dr.rasterize(str(borders_path), affine=affine, shape=shape)[0],
+                key=f"coasts {affine} {shape}",
+            )
 
         if type == "binary":
             logger.info("Creating binary borders raster")
@@ -150,7 +170,8 @@ class DISTANCE_TO_COAST(Dataset):
                 logger.info(f"Raster previously created: {borders_output_raster_path}")
             else:
                 try:
-                    dr.export_raster(borders, affine, borders_output_raster_path)
+                    with self.tmp_to_dst_file(borders_output_raster_path) as tmp_path:
+                        dr.export_raster(rasterize_borders(), affine, tmp_path)
                     logger.info(f"Binary raster created: {borders_output_raster_path}")
                     return_list.append(("Success", str(borders_output_raster_path)))
                 except Exception as e:
@@ -170,12 +191,29 @@ class DISTANCE_TO_COAST(Dataset):
                 logger.info(f"Raster previously created: {distance_output_raster_path}")
             else:
                 try:
-                    dr.DistanceRaster(
-                        borders,
-                        affine=affine,
-                        output_path=distance_output_raster_path,
-                        conditional=self.raster_conditional,
+                    # reuse an existing binary raster rather than rasterizing again
+                    borders_output_raster_path = (
+                        self.output_dir / "binary" / "GSHHS_coasts_binary.tif"
                     )
+                    if (
+                        borders_output_raster_path.exists()
+                        and not self.overwrite_binary_raster
+                    ):
+                        logger.info(f"Using binary raster: {borders_output_raster_path}")
+                        borders = borders_output_raster_path
+                    else:
+                        borders = rasterize_borders()
+                    with self.tmp_to_dst_file(
+                        distance_output_raster_path, validate_cog=True
+                    ) as tmp_path:
+                        distance_raster(
+                            borders,
+                            tmp_path,
+                            affine=affine,
+                            conditional=self.raster_conditional,
+                            tile_size=self.distance_tile_size,
+                            max_workers=self.distance_workers,
+                        )
                     logger.info(
                         f"Distance raster created: {distance_output_raster_path}"
                     )
@@ -1,12 +1,24 @@
+import multiprocessing
 import os
 import shutil
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
 from pathlib import Path
 from zipfile import ZipFile
 
-import distancerasters as dr
+import fiona
+import numpy as np
+import rasterio
 import requests
 from affine import Affine
-from data_manager import BaseDatasetConfiguration, Dataset, get_config
+from data_manager import (
+    BaseDatasetConfiguration,
+    Dataset,
+    cached_source_raster,
+    distance_raster,
+    get_config,
+)
+from rasterio import features, windows
+from rasterio.windows import Window
 
 
 class DistanceToBordersConfiguration(BaseDatasetConfiguration):
@@ -17,6 +29,38 @@ class DistanceToBordersConfiguration(BaseDatasetConfiguration):
     overwrite_binary_raster: bool
     overwrite_distance_raster: bool
     adm_levels: str
+    # width and height, in pixels, of the tiles distances are computed in
+    distance_tile_size: int = 1024
+    # threads computing distance tiles, 0 uses all cores
+    distance_workers: int = 0
+    # width and height, in pixels, of the tiles borders are rasterized in
+    rasterize_tile_size: int = 4096
+    # processes rasterizing border tiles, 0 uses all cores
+    rasterize_workers: int = 0
+
+
+def rasterize_tile(borders_path, window, affine):
+    """
+    Rasterize the borders intersecting a single window of the grid
+
+    Runs in a worker process, so only the features within the window's
+    bounds are read from the shapefile.
+    """
+    with fiona.open(borders_path) as src:
+        shapes = [
+            (feature.geometry, 1)
+            for feature in src.filter(bbox=windows.bounds(window, affine))
+        ]
+    if not shapes:
+        return window, np.zeros((window.height, window.width), dtype="uint8")
+    data = features.rasterize(
+        shapes,
+        out_shape=(window.height, window.width),
+        transform=windows.transform(window, affine),
+        all_touched=True,
+        dtype="uint8",
+    )
+    return window, data
 
 
 class DistanceToBorders(Dataset):
@@ -30,6 +74,10 @@ class DistanceToBorders(Dataset):
         self.overwrite_binary_raster = config.overwrite_binary_raster
         self.overwrite_distance_raster = config.overwrite_distance_raster
         self.adm_levels = [i.strip() for i in config.adm_levels.split(",") if i.strip()]
+        self.distance_tile_size = config.distance_tile_size
+        self.distance_workers = config.distance_workers or os.cpu_count()
+        self.rasterize_tile_size = config.rasterize_tile_size
+        self.rasterize_workers = config.rasterize_workers or os.cpu_count()
 
     def raster_conditional(self, rarray):
         return rarray == 1
@@ -115,6 +163,68 @@ class DistanceToBorders(Dataset):
         file_path = zip_path / zip_file
         return (file_path, dst_path)
 
+    def rasterize_borders(self, level, affine, shape):
+        """
+        Rasterize borders into a binary array, tile by tile in worker
+        processes, caching it under raw_dir so later runs reuse it
+        """
+        borders_path = self.raw_dir / f"geoBoundariesCGAZ_{level}.shp"
+
+        def build():
+            tile_size = self.rasterize_tile_size
+            tiles = [
+                Window(col, row, min(tile_size, shape[1] - col), min(tile_size, shape[0] - row))
+                for row in range(0, shape[0], tile_size)
+                for col in range(0, shape[1], tile_size)
+            ]
+            borders = np.zeros(shape, dtype="uint8")
+            # daemonic processes (e.g. the mp backend's workers) can't start
+            # processes of their own, so fall back to threads there
+            if multiprocessing.current_process().daemon:
+                executor = ThreadPoolExecutor
+            else:
+                executor = ProcessPoolExecutor
+            with executor(self.rasterize_workers) as pool:
+                futures = [
+                    pool.submit(rasterize_tile, str(borders_path), window, affine)
+                    for window in tiles
+                ]
+                for future in as_completed(futures):
+                    window, data = future.result()
+                    borders[window.toslices()] = data
+            return borders
+
+        return cached_source_raster(
+            self.raw_dir / "cache",
+            [borders_path],
+            build,
+            key=f"{level} {affine} {shape} all_touched",
+        )
+
+    def write_binary_raster(self, borders, dst_path, affine):
+        """
+        Write a binary borders array to a raster, block by block
+        """
+        meta = {
+            "driver": "GTiff",
+            "dtype": "float64",
+            "count": 1,
+            "height": borders.shape[0],
+            "width": borders.shape[1],
+            "crs": "EPSG:4326",
+            "transform": affine,
+            "tiled": True,
+            "blockxsize": 512,
+            "blockysize": 512,
+            "BIGTIFF": "IF_SAFER",
+        }
+        with self.tmp_to_dst_file(dst_path, make_dst_dir=True) as tmp_path:
+            with rasterio.open(tmp_path, "w", **meta) as dst:
+                for _, window in dst.block_windows(1):
+                    dst.write(
+                        borders[window.toslices()].astype("float64"), 1, window=window
+                    )
+
     def create_raster(self, level="ADM0"):
         """
         Create binary and distance raster for borders
@@ -130,8 +240,6 @@ class DistanceToBorders(Dataset):
         ymax = 90
         affine = Affine(pixel_size, 0, xmin, 0, -pixel_size, ymax)
         shape = (int((ymax - ymin) / pixel_size), int((xmax - xmin) / pixel_size))
-        borders_path = str(self.raw_dir) + f"/geoBoundariesCGAZ_{level}.shp"
-        borders, _ = dr.rasterize(borders_path, affine=affine, shape=shape)
 
         logger.info(f"Creating binary borders raster for {level}")
         borders_output_raster_path = (
@@ -144,7 +252,11 @@ class DistanceToBorders(Dataset):
             logger.info(f"Raster previously created: {borders_output_raster_path}")
         else:
             try:
-                dr.export_raster(borders, affine, borders_output_raster_path)
+                self.write_binary_raster(
+                    self.rasterize_borders(level, affine, shape),
+                    borders_output_raster_path,
+                    affine,
+                )
                 logger.info(f"Binary raster created: {borders_output_raster_path}")
                 return_list.append(("Success", str(borders_output_raster_path)))
             except Exception as e:
@@ -164,12 +276,23 @@ class DistanceToBorders(Dataset):
             logger.info(f"Raster previously created: {distance_output_raster_path}")
         else:
             try:
-                dr.DistanceRaster(
-                    borders,
-                    affine=affine,
-                    output_path=distance_output_raster_path,
-                    conditional=self.raster_conditional,
-                )
+                # reuse an existing binary raster rather than rasterizing again
+                if borders_output_raster_path.exists():
+                    logger.info(f"Using binary raster: {borders_output_raster_path}")
+                    borders = borders_output_raster_path
+                else:
+                    borders = self.rasterize_borders(level, affine, shape)
+                with self.tmp_to_dst_file(
+                    distance_output_raster_path, validate_cog=True
+                ) as tmp_path:
+                    distance_raster(
+                        borders,
+                        tmp_path,
+                        affine=affine,
+                        conditional=self.raster_conditional,
+                        tile_size=self.distance_tile_size,
+                        max_workers=self.distance_workers,
+                    )
                 logger.info(f"Distance raster created: {distance_output_raster_path}")
                 return_list.append(("Success", str(distance_output_raster_path)))
             except Exception as e:
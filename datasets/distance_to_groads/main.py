@@ -11,6 +11,7 @@ degree binary grid, and builds a distance-to-nearest-road raster from it.
 Because the geodatabase is read directly from the downloaded zip via GDAL's
 `/vsizip/`, no separate extraction step is needed.
 """
+import os
 from pathlib import Path
 
 import distancerasters as dr
@@ -19,7 +20,13 @@ import requests
 from affine import Affine
 from pydantic import field_validator
 
-from data_manager import BaseDatasetConfiguration, Dataset, get_config
+from data_manager import (
+    BaseDatasetConfiguration,
+    Dataset,
+    cached_source_raster,
+    distance_raster,
+    get_config,
+)
 
 DOWNLOAD_URL = (
     "https://data.earthdata.nasa.gov/nasa-earth/human-dimensions/sedac-root/"
@@ -38,6 +45,10 @@ class DistanceToGRoadsConfiguration(BaseDatasetConfiguration):
     overwrite_download: bool
     overwrite_binary_raster: bool
     overwrite_distance_raster: bool
+    # width and height, in pixels, of the tiles distances are computed in
+    distance_tile_size: int = 1024
+    # threads computing distance tiles, 0 uses all cores
+    distance_workers: int = 0
 
     @field_validator("raw_dir", "output_dir")
     @classmethod
@@ -58,6 +69,8 @@ class DistanceToGRoads(Dataset):
         self.overwrite_download = config.overwrite_download
         self.overwrite_binary_raster = config.overwrite_binary_raster
         self.overwrite_distance_raster = config.overwrite_distance_raster
+        self.distance_tile_size = config.distance_tile_size
+        self.distance_workers = config.distance_workers or os.cpu_count()
 
         self.download_path = self.raw_dir / "groads-v1-global-gdb.zip"
 
@@ -102,12 +115,17 @@ class DistanceToGRoads(Dataset):
         logger.info(f"Downloaded {self.download_path}")
 
     def build_binary_raster(self):
+        """
+        Rasterize the road network, returning the binary raster and its
+        transform. If the binary raster already exists it is not rebuilt,
+        and its path is returned in place of the raster, with no transform.
+        """
         logger = self.get_logger()
 
         binary_path = self.output_dir / "binary" / "groads_binary.tif"
         if not self.overwrite_binary_raster and binary_path.exists():
             logger.info(f"Binary raster exists, skipping: {binary_path}")
-            return None, None
+            return binary_path, None
 
         shape = (
             round((YMAX - YMIN) / self.pixel_size),
@@ -117,8 +135,13 @@ class DistanceToGRoads(Dataset):
 
         gdb_path = f"/vsizip/{{{self.download_path}}}/groads-v1-global-gdb/gROADS_v1.gdb"
         logger.info(f"Rasterizing {gdb_path}")
-        roads, affine = dr.rasterize(
-            gdb_path, layer=GDB_LAYER, affine=affine, shape=shape
+        roads = cached_source_raster(
+            self.raw_dir / "cache",
+            [self.download_path],
+            lambda: dr.rasterize(
+                gdb_path, layer=GDB_LAYER, affine=affine, shape=shape
+            )[0],
+            key=f"{GDB_LAYER} {affine} {shape}",
         )
 
         logger.info(f"Writing binary raster to {binary_path}")
@@ -127,6 +150,10 @@ class DistanceToGRoads(Dataset):
         return roads, affine
 
     def build_distance_raster(self, roads, affine):
+        """
+        Build the distance raster from a binary road raster, either an
+        array and its transform or the path of an existing binary raster.
+        """
         logger = self.get_logger()
 
         distance_path = self.output_dir / "distance" / "groads_distance.tif"
@@ -134,21 +161,19 @@ class DistanceToGRoads(Dataset):
             logger.info(f"Distance raster exists, skipping: {distance_path}")
             return
 
-        if roads is None:
-            raise ValueError(
-                "Binary road raster not available in memory; set "
-                "overwrite_binary_raster=true to rebuild it alongside the "
-                "distance raster."
+        logger.info(f"Calculating distance raster to {distance_path}")
+        with self.tmp_to_dst_file(
+            distance_path, make_dst_dir=True, validate_cog=True
+        ) as tmp:
+            distance_raster(
+                roads,
+                tmp,
+                affine=affine,
+                conditional=self.raster_conditional,
+                tile_size=self.distance_tile_size,
+                max_workers=self.distance_workers,
             )
 
-        logger.info("Calculating distance raster")
-        dist = dr.DistanceRaster(
-            roads, affine=affine, conditional=self.raster_conditional
-        )
-
-        logger.info(f"Writing distance raster to {distance_path}")
-        self.write_cog(dist.dist_array, dist.affine, None, distance_path)
-
     def main(self):
         logger = self.get_logger()
 
@@ -8,7 +8,13 @@ import distancerasters as dr
 import numpy as np
 import requests
 from affine import Affine
-from data_manager import BaseDatasetConfiguration, Dataset, get_config
+from data_manager import (
+    BaseDatasetConfiguration,
+    Dataset,
+    cached_source_raster,
+    distance_raster,
+    get_config,
+)
 
 
 class DISTANCE_TO_WATER_Configuration(BaseDatasetConfiguration):
@@ -29,6 +35,10 @@ class DISTANCE_TO_WATER_Configuration(BaseDatasetConfiguration):
     overwrite_extract: bool
     overwrite_binary_raster: bool
     overwrite_distance_raster: bool
+    # width and height, in pixels, of the tiles distances are computed in
+    distance_tile_size: int = 1024
+    # threads computing distance tiles, 0 uses all cores
+    distance_workers: int = 0
 
 
 class DISTANCE_TO_WATER(Dataset):
@@ -54,6 +64,9 @@ class DISTANCE_TO_WATER(Dataset):
         self.overwrite_binary_raster = config.overwrite_binary_raster
         self.overwrite_distance_raster = config.overwrite_distance_raster
 
+        self.distance_tile_size = config.distance_tile_size
+        self.distance_workers = config.distance_workers or os.cpu_count()
+
     def raster_conditional(self, rarray):
         return rarray == 1
 
@@ -181,6 +194,31 @@ class DISTANCE_TO_WATER(Dataset):
         file_path = zip_path / zip_file
         return (file_path, dst_path)
 
+    def rasterize_water(self, affine, shape):
+        """
+        Rasterize shorelines, lakes and rivers into a single water raster,
+        cached in raw_dir so it is only rebuilt when a source changes
+        """
+        shorelines_path = self.raw_dir / "gshhg" / "GSHHS_f_L1.shp"
+        lakes_path = self.raw_dir / "natural-earth-vector" / "ne_10m_lakes.shp"
+        rivers_path = (
+            self.raw_dir / "natural-earth-vector" / "ne_10m_rivers_lake_centerlines.shp"
+        )
+
+        def build():
+            shorelines, _ = dr.rasterize(str(shorelines_path), affine=affine, shape=shape)
+            shorelines = np.logical_not(shorelines).astype(int)
+            lakes, _ = dr.rasterize(str(lakes_path), affine=affine, shape=shape)
+            rivers, _ = dr.rasterize(str(rivers_path), affine=affine, shape=shape)
+            return shorelines + lakes + rivers
+
+        return cached_source_raster(
+            self.raw_dir / "cache",
+            [shorelines_path, lakes_path, rivers_path],
+            build,
+            key=f"water {affine} {shape}",
+        )
+
     def create_raster(self, type):
         """
         Create binary and distance raster for borders
@@ -197,33 +235,20 @@ class DISTANCE_TO_WATER(Dataset):
         affine = Affine(pixel_size, 0, xmin, 0, -pixel_size, ymax)
         shape = (int((ymax - ymin) / pixel_size), int((xmax - xmin) / pixel_size))
 
-        shorelines_path = str(self.raw_dir) + "/gshhg/GSHHS_f_L1.shp"
-        shorelines, _ = dr.rasterize(shorelines_path, affine=affine, shape=shape)
-        shorelines = np.logical_not(shorelines).astype(int)
-
-        lakes_path = str(self.raw_dir) + "/natural-earth-vector/ne_10m_lakes.shp"
-        lakes, _ = dr.rasterize(lakes_path, affine=affine, shape=shape)
-
-        rivers_path = (
-            str(self.raw_dir)
-            + "/natural-earth-vector/ne_10m_rivers_lake_centerlines.shp"
-        )
-        rivers, _ = dr.rasterize(rivers_path, affine=affine, shape=shape)
-
-        water = shorelines + lakes + rivers
-
         if type == "binary":
             logger.info("Creating binary raster")
             water_output_raster_path = str(self.output_dir) + "/binary/water_binary.tif"
             Path(water_output_raster_path).parent.mkdir(parents=True, exist_ok=True)
             if (
                 os.path.isfile(water_output_raster_path)
-                and not self.overwrite_distance_raster
+                and not self.overwrite_binary_raster
             ):
                 logger.info(f"Raster previously created: {water_output_raster_path}")
             else:
                 try:
-                    dr.export_raster(water, affine, water_output_raster_path)
+                    water = self.rasterize_water(affine, shape)
+                    with self.tmp_to_dst_file(water_output_raster_path) as tmp_path:
+                        dr.export_raster(water, affine, tmp_path)
                     logger.info(f"Water raster created: {water_output_raster_path}")
                     return ("Success", str(water_output_raster_path))
                 except Exception as e:
@@ -243,12 +268,24 @@ class DISTANCE_TO_WATER(Dataset):
                 logger.info(f"Raster previously created: {distance_output_raster_path}")
             else:
                 try:
-                    dr.DistanceRaster(
-                        water,
-                        affine=affine,
-                        output_path=distance_output_raster_path,
-                        conditional=self.raster_conditional,
-                    )
+                    # reuse an existing binary raster rather than rasterizing again
+                    water_output_raster_path = self.output_dir / "binary" / "water_binary.tif"
+                    if water_output_raster_path.exists() and not self.overwrite_binary_raster:
+                        logger.info(f"Using binary raster: {water_output_raster_path}")
+                        water = water_output_raster_path
+                    else:
+                        water = self.rasterize_water(affine, shape)
+                    with self.tmp_to_dst_file(
+                        distance_output_raster_path, validate_cog=True
+                    ) as tmp_path:
+                        distance_raster(
+                            water,
+                            tmp_path,
+                            affine=affine,
+                            conditional=self.raster_conditional,
+                            tile_size=self.distance_tile_size,
+                            max_workers=self.distance_workers,
+                        )
                     logger.info(
                         f"Distance raster created: {distance_output_raster_path}"
                     )
@@ -23,10 +23,9 @@ import threading
 from pathlib import Path
 
 import numpy as np
-import rasterio
 import requests
 from bs4 import BeautifulSoup
-from data_manager import BaseDatasetConfiguration, Dataset, get_config
+from data_manager import BaseDatasetConfiguration, Dataset, get_config, raster_calc
 
 from intercalibration_coefficients import COEFFICIENTS
 
@@ -75,6 +74,8 @@ class DMSPOLSConfiguration(BaseDatasetConfiguration):
     mod_auth_openidc_session: str
     overwrite_download: bool
     overwrite_processing: bool
+    # number of threads calibrating windows of each composite (0 uses all cores)
+    calc_workers: int = 0
 
 
 class DMSPOLS(Dataset):
@@ -89,6 +90,7 @@ class DMSPOLS(Dataset):
         self.cookies = {"mod_auth_openidc_session": config.mod_auth_openidc_session}
         self.overwrite_download = config.overwrite_download
         self.overwrite_processing = config.overwrite_processing
+        self.calc_workers = config.calc_workers
         self.coef = COEFFICIENTS["ELVIDGE2014"]
 
     def test_connection(self):
@@ -195,13 +197,35 @@ class DMSPOLS(Dataset):
         logger.info(f"Downloaded {local_filename}")
         return (satyear, local_filename)
 
+    def calibration_table(self, sat, year):
+        """
+        Elvidge-2014 calibrated value of every 8-bit DN, as a 256-entry
+        lookup table.
+
+        dn_adjusted = c0 + c1*dn + c2*dn^2, rounded and capped at 63.
+        Background (0) stays 0 and the 255 nodata value is preserved.
+        """
+        c0, c1, c2 = self.coef[sat][year][:3]
+        dn = np.arange(256, dtype="float64")
+        # c0 + c1*dn + c2*dn^2 in Horner form, in place
+        table = dn * c2
+        table += c1
+        table *= dn
+        table += c0
+        np.round(table, out=table)
+        np.clip(table, 0, 63, out=table)
+        table = table.astype("uint8")
+        table[0] = 0
+        table[255] = 255
+        return table
+
     def calibrate(self, satyear, raw_path):
         """
         Apply the Elvidge-2014 inter-satellite calibration to a raw stable-lights
         composite and write a Cloud Optimized GeoTIFF.
 
-        dn_adjusted = c0 + c1*dn + c2*dn^2, capped at 63. Background (0) stays 0
-        and the 255 nodata value is preserved.
+        The composite's DNs are 8-bit, so the calibration is a lookup into
+        `calibration_table`, applied window by window on a thread pool.
         """
         logger = self.get_logger()
         sat, year = satyear[0:3], satyear[3:7]
@@ -211,31 +235,20 @@ class DMSPOLS(Dataset):
             logger.info(f"Calibrated file exists: {output_path}")
             return (satyear, output_path)
 
-        c0, c1, c2 = self.coef[sat][year][:3]
-
-        with rasterio.open(raw_path) as src:
-            profile = src.profile.copy()
-            data = src.read(1)
-
-        masked = np.ma.MaskedArray(data, mask=data == 0)
-        out = c0 + (c1 * masked) + (c2 * masked ** 2)
-        out[np.where(out > 63)] = 63
-        out = np.uint8(np.round(out))
-        out[np.where(masked == 255)] = 255
-        out = out.filled(0)
-
-        profile.update(
-            driver="COG", compress="LZW", dtype="uint8", count=1, nodata=255
-        )
-        # COG driver rejects these GTiff-only creation options if carried over
-        for k in ("blockxsize", "blockysize", "tiled", "interleave"):
-            profile.pop(k, None)
+        table = self.calibration_table(sat, year)
 
         with self.tmp_to_dst_file(
             output_path, make_dst_dir=True, tmp_dir=self.output_dir, validate_cog=True
         ) as tmp_dst:
-            with rasterio.open(tmp_dst, "w", **profile) as dst:
-                dst.write(out, 1)
+            raster_calc(
+                [raw_path],
+                {tmp_dst: lambda dn: table[dn]},
+                dtypes={tmp_dst: "uint8"},
+                nodata={tmp_dst: 255},
+                # calibrated DNs are a brightness scale, not classes
+                categorical={tmp_dst: False},
+                max_workers=self.calc_workers or None,
+            )
 
         logger.info(f"Calibrated {output_path}")
         return (satyear, output_path)
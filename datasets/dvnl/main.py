@@ -2,13 +2,12 @@
 # info link: https://eogdata.mines.edu/products/dmsp/#dvnl
 import os
 import threading
-from copy import copy
 from pathlib import Path
 
 import rasterio
+import rasterio.shutil
 import requests
-from data_manager import BaseDatasetConfiguration, Dataset, get_config
-from rasterio import windows
+from data_manager import BaseDatasetConfiguration, Dataset, cog_profile, get_config
 
 # EOG (eogdata.mines.edu) moved programmatic access behind a paid OAuth tier, so
 # downloads now authenticate with a browser session cookie (mod_auth_openidc)
@@ -144,39 +143,15 @@ class DVNL(Dataset):
             return (src_path, dst_path)
 
         else:
-            with rasterio.open(src_path, "r") as src:
-
-                profile = copy(src.profile)
-
-                profile.update(
-                    {
-                        "driver": "COG",
-                        "compress": "LZW",
-                    }
-                )
-
-                with rasterio.open(dst_path, "w+", **profile) as dst:
-
-                    for ji, src_window in src.block_windows(1):
-                        # convert relative input window location to relative output window location
-                        # using real world coordinates (bounds)
-                        src_bounds = windows.bounds(
-                            src_window, transform=src.profile["transform"]
-                        )
-                        dst_window = windows.from_bounds(
-                            *src_bounds, transform=dst.profile["transform"]
-                        )
-                        # round the values of dest_window as they can be float
-                        dst_window = windows.Window(
-                            round(dst_window.col_off),
-                            round(dst_window.row_off),
-                            round(dst_window.width),
-                            round(dst_window.height),
-                        )
-                        # read data from source window
-                        r = src.read(1, window=src_window)
-                        # write data to output window
-                        dst.write(r, 1, window=dst_window)
+            with rasterio.open(src_path) as src:
+                dtype = src.dtypes[0]
+            # a straight copy, which keeps any overviews the source already has
+            # rather than computing them again
+            rasterio.shutil.copy(
+                src_path,
+                dst_path,
+                **cog_profile(dtype, categorical=False, reuse_overviews=True),
+            )
             logger.info(f"File Converted: {dst_path}")
             return (src_path, dst_path)
 
@@ -11,7 +11,7 @@ from typing import List
 import cdsapi
 import numpy as np
 import rasterio
-from data_manager import BaseDatasetConfiguration, Dataset, get_config
+from data_manager import BaseDatasetConfiguration, Dataset, cog_profile, get_config
 
 
 class ESALandcoverConfiguration(BaseDatasetConfiguration):
@@ -130,18 +130,11 @@ class ESALandcover(Dataset):
             logger.info(f"Running raster calc {tmp_input_path} {tmp_output_path}")
             netcdf_path = f"netcdf:{tmp_input_path}:lccs_class"
 
-            default_meta = {
-                # 'count': 1,
-                # 'crs': {'init': 'epsg:4326'},
-                "driver": "COG",
-                "compress": "LZW",
-                # 'nodata': -9999,
-            }
-
             with rasterio.open(netcdf_path) as src:
                 assert len(set(src.block_shapes)) == 1
                 meta = src.meta.copy()
-                meta.update(**default_meta)
+                # land cover classes, so overviews use nearest resampling
+                meta.update(**cog_profile(meta["dtype"], categorical=True))
                 with rasterio.open(tmp_output_path, "w", **meta) as dst:
                     for ji, window in src.block_windows(1):
                         in_data = src.read(window=window)
@@ -15,7 +15,7 @@ import geopandas as gpd
 import requests
 from pydantic import field_validator
 
-from data_manager import BaseDatasetConfiguration, Dataset, get_config
+from data_manager import BaseDatasetConfiguration, Dataset, get_config, write_vector
 
 FILTER_INGEST_TEMPLATE = Path(__file__).parent / "filter_ingest.json"
 
@@ -90,7 +90,7 @@ class GcdfV301Dynamic(Dataset):
 
         logger.info(f"Writing {self.output_path}")
         with self.tmp_to_dst_file(self.output_path, make_dst_dir=True) as tmp:
-            gdf.to_file(tmp, layer="gcdf_v301_dynamic", driver="GPKG")
+            write_vector(gdf, tmp, layer="gcdf_v301_dynamic")
 
         return gdf
 
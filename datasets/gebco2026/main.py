@@ -19,7 +19,7 @@ from pydantic import field_validator
 from rasterio.merge import merge
 from rasterio.windows import Window
 
-from data_manager import BaseDatasetConfiguration, Dataset, get_config
+from data_manager import BaseDatasetConfiguration, Dataset, cog_profile, get_config
 
 DOWNLOAD_URL = (
     "https://dap.ceda.ac.uk/bodc/gebco/global/gebco_2026/"
@@ -107,8 +107,7 @@ class Gebco2026(Dataset):
             logger.info(f"Elevation raster exists, skipping: {self.elevation_path}")
         else:
             dst_kwds = {
-                "driver": "COG",
-                "compress": "LZW",
+                **cog_profile(dtype),
                 "dtype": dtype,
                 "nodata": nodata,
                 # global mosaic is well over the 4GB Classic TIFF limit
@@ -116,8 +115,9 @@ class Gebco2026(Dataset):
             }
 
             logger.info(f"Mosaicking {len(tiles)} tiles to {self.elevation_path}")
+            # sampled validation: a full check of the global mosaic is slow
             with self.tmp_to_dst_file(
-                self.elevation_path, make_dst_dir=True, validate_cog=True
+                self.elevation_path, make_dst_dir=True, validate_cog="sampled"
             ) as tmp:
                 merge(tiles, dst_path=tmp, dst_kwds=dst_kwds)
             logger.info(f"Wrote {self.elevation_path}")
@@ -139,12 +139,11 @@ class Gebco2026(Dataset):
         dy = METERS_PER_DEGREE * pixel_size_deg
 
         meta = {
+            **cog_profile("float32"),
             "count": 1,
             "crs": "EPSG:4326",
             "dtype": "float32",
             "transform": affine,
-            "driver": "COG",
-            "compress": "LZW",
             "height": height,
             "width": width,
             "nodata": slope_nodata,
@@ -158,7 +157,7 @@ class Gebco2026(Dataset):
 
         logger.info(f"Writing slope raster to {self.slope_path}")
         with self.tmp_to_dst_file(
-            self.slope_path, make_dst_dir=True, validate_cog=True
+            self.slope_path, make_dst_dir=True, validate_cog="sampled"
         ) as tmp:
             with rasterio.open(self.elevation_path) as src, rasterio.open(
                 tmp, "w", **meta
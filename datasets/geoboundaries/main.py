@@ -1,12 +1,21 @@
+import hashlib
 import json
 from pathlib import Path
+from typing import Optional
 
 import geopandas as gpd
+import pyogrio
 import requests
 from pydantic import field_validator
 import shapely
 
-from data_manager import BaseDatasetConfiguration, Dataset, get_config
+from data_manager import (
+    BaseDatasetConfiguration,
+    Dataset,
+    get_config,
+    read_vector,
+    write_vector,
+)
 
 
 class geoBoundariesDownloadConfiguration(BaseDatasetConfiguration):
@@ -20,6 +29,10 @@ class geoBoundariesDownloadConfiguration(BaseDatasetConfiguration):
     # input instead of the array widget, whose "add item" button submits the form.
     dl_iso3_list: str = ""
     ingest_dir: str = "/data/boundaries/geoboundaries"
+    # Directory downloaded GeoJSON is cached in, revalidated against the
+    # server (ETag / Last-Modified) rather than downloaded again; empty means
+    # a "cache" directory inside output_dir.
+    cache_dir: str = ""
 
     @field_validator("output_dir")
     @classmethod
@@ -43,6 +56,9 @@ class geoBoundariesDownloadDataset(Dataset):
         ]
         self.api_url = f"https://raw.githubusercontent.com/wmgeolab/gbWeb/{self.commit}/api/current/gbOpen/ALL/ALL/index.json"
         self.ingest_dir = Path(config.ingest_dir)
+        self.cache_dir = (
+            Path(config.cache_dir) if config.cache_dir else config.output_dir / "cache"
+        )
 
     def prepare(self):
         logger = self.get_logger()
@@ -88,25 +104,36 @@ class geoBoundariesDownloadDataset(Dataset):
             logger.info(f"Downloading: {dl_url}")
 
         if meta_only:
+            # the extent is stored in the GPKG header, no need to read features
             try:
-                gdf = gpd.read_file(gpkg_path)
+                total_bounds = pyogrio.read_info(gpkg_path, force_total_bounds=True)[
+                    "total_bounds"
+                ]
             except Exception as e:
                 logger.error(f"Failed to read existing GPKG {gpkg_path}: {e}")
                 return
         else:
             try:
-                gdf = gpd.read_file(dl_url)
+                geojson_path = self.fetch(dl_url)
+            except Exception as e:
+                logger.error(f"Failed to download {dl_url}: {e}")
+                return
+            if geojson_path is None:
+                logger.error(f"404: {dl_url}")
+                return
+
+            try:
+                gdf = read_vector(geojson_path)
             except Exception:
-                if requests.get(dl_url).status_code == 404:
-                    logger.error(f"404: {dl_url}")
+                try:
+                    with open(geojson_path) as f:
+                        raw_json = json.load(f)
+                    gdf = gpd.GeoDataFrame.from_features(
+                        raw_json["features"], crs="EPSG:4326"
+                    )
+                except Exception as e:
+                    logger.error(f"Failed to read {dl_url}: {e}")
                     return
-                else:
-                    try:
-                        raw_json = requests.get(dl_url).json()
-                        gdf = gpd.GeoDataFrame.from_features(raw_json["features"])
-                    except Exception as e:
-                        logger.error(f"Failed to download {dl_url}: {e}")
-                        return
 
             if "shapeName" not in gdf.columns:
                 potential_name_field = f"{fc_type}_NAME"
@@ -115,7 +142,9 @@ class geoBoundariesDownloadDataset(Dataset):
                 else:
                     gdf["shapeName"] = None
 
-            gdf.to_file(gpkg_path, driver="GPKG")
+            with self.tmp_to_dst_file(gpkg_path, make_dst_dir=True) as tmp:
+                write_vector(gdf, tmp, layer=gpkg_path.stem)
+            total_bounds = gdf.total_bounds
 
 
         # Export raw metadata from gB
@@ -126,7 +155,7 @@ class geoBoundariesDownloadDataset(Dataset):
 
         # Calculate spatial extent
         logger.debug(f"Calculating bounding box for {fc_name}")
-        spatial_extent_wkt = shapely.box(*gdf.total_bounds).wkt
+        spatial_extent_wkt = shapely.box(*total_bounds).wkt
         adm_meta["spatial_extent"] = spatial_extent_wkt
 
         # Export processed metadata for GeoQuery ingest
@@ -139,6 +168,56 @@ class geoBoundariesDownloadDataset(Dataset):
         logger.info(f"Successfully downloaded {fc_name}")
 
 
+    def fetch(self, url: str) -> Optional[Path]:
+        """
+        Download `url` into the cache directory, unless the cached copy is
+        still current, and return the cached file's path (`None` on a 404).
+
+        Each download saves the response's ETag and Last-Modified headers
+        next to the file, and later calls send them back as conditional
+        request headers, so an unchanged file costs a 304 instead of a
+        full download.
+        """
+        logger = self.get_logger()
+
+        name = hashlib.sha256(url.encode()).hexdigest()[:16]
+        cache_path = self.cache_dir / f"{name}_{Path(url).name}"
+        validators_path = cache_path.with_name(cache_path.name + ".headers.json")
+
+        headers = {}
+        if cache_path.exists() and validators_path.exists():
+            with open(validators_path) as f:
+                validators = json.load(f)
+            if validators.get("etag"):
+                headers["If-None-Match"] = validators["etag"]
+            if validators.get("last_modified"):
+                headers["If-Modified-Since"] = validators["last_modified"]
+
+        # one connection pool per thread, reused across items
+        session = self.cached(("geoboundaries", "session"), requests.Session, per_thread=True)
+        with session.get(url, headers=headers, stream=True, timeout=300) as response:
+            if response.status_code == 304:
+                logger.debug(f"Cached copy of {url} is current")
+                return cache_path
+            if response.status_code == 404:
+                return None
+            response.raise_for_status()
+
+            with self.tmp_to_dst_file(cache_path, make_dst_dir=True) as tmp:
+                with open(tmp, "wb") as dst:
+                    for chunk in response.iter_content(chunk_size=1024 * 1024):
+                        dst.write(chunk)
+            validators = {
+                "etag": response.headers.get("ETag"),
+                "last_modified": response.headers.get("Last-Modified"),
+            }
+
+        with self.tmp_to_dst_file(validators_path) as tmp:
+            with open(tmp, "w") as f:
+                json.dump(validators, f)
+        return cache_path
+
+
     def build_metadata(self, item: dict, fc_name: str) -> dict:
         """Build metadata dictionary for a geoBoundaries item."""
         iso3 = item["boundaryISO"]
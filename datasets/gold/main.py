@@ -19,15 +19,16 @@ https://www.researchgate.net/publication/281849073_GOLDATA_12_v, extracted,
 and each layer's shapefile placed at `<raw_dir>/<layer>/<layer>.shp` — see
 README.md.
 """
+import os
 from pathlib import Path
 
 import numpy as np
 import rasterio
 from affine import Affine
-from distancerasters import DistanceRaster, rasterize
+from distancerasters import rasterize
 from pydantic import field_validator
 
-from data_manager import BaseDatasetConfiguration, Dataset, get_config
+from data_manager import BaseDatasetConfiguration, Dataset, distance_raster, get_config
 
 # layer name -> category value; L/S computed first (used for the distance
 # raster), NL folded in afterward
@@ -44,6 +45,10 @@ class GoldConfiguration(BaseDatasetConfiguration):
     pixel_size: float
     overwrite_categorical_raster: bool
     overwrite_distance_raster: bool
+    # width and height, in pixels, of the tiles distances are computed in
+    distance_tile_size: int = 1024
+    # threads computing distance tiles, 0 uses all cores
+    distance_workers: int = 0
 
     @field_validator("raw_dir", "output_dir")
     @classmethod
@@ -62,6 +67,8 @@ class Gold(Dataset):
         self.pixel_size = config.pixel_size
         self.overwrite_categorical_raster = config.overwrite_categorical_raster
         self.overwrite_distance_raster = config.overwrite_distance_raster
+        self.distance_tile_size = config.distance_tile_size
+        self.distance_workers = config.distance_workers or os.cpu_count()
 
     def raster_conditional(self, rarray):
         return rarray > 0
@@ -120,13 +127,18 @@ class Gold(Dataset):
             logger.info(f"Distance raster exists, skipping: {distance_path}")
             return
 
-        logger.info("Calculating distance raster")
-        dist = DistanceRaster(
-            lootable, affine=affine, conditional=self.raster_conditional
-        )
-
-        logger.info(f"Writing distance raster to {distance_path}")
-        self.write_cog(dist.dist_array, dist.affine, None, distance_path)
+        logger.info(f"Calculating distance raster to {distance_path}")
+        with self.tmp_to_dst_file(
+            distance_path, make_dst_dir=True, validate_cog=True
+        ) as tmp:
+            distance_raster(
+                lootable,
+                tmp,
+                affine=affine,
+                conditional=self.raster_conditional,
+                tile_size=self.distance_tile_size,
+                max_workers=self.distance_workers,
+            )
 
     def build_categorical_raster(self, output, affine):
         logger = self.get_logger()
@@ -5,7 +5,12 @@ from pathlib import Path
 
 import numpy as np
 import rasterio
-from data_manager import BaseDatasetConfiguration, Dataset, get_config
+from data_manager import (
+    BaseDatasetConfiguration,
+    Dataset,
+    aggregate_rasters,
+    get_config,
+)
 
 
 class GPMConfiguration(BaseDatasetConfiguration):
@@ -17,79 +22,14 @@ class GPMConfiguration(BaseDatasetConfiguration):
     # Prefect run form renders a text input rather than the array widget,
     # whose "add item" button submits the form.
     years: str
+    # Comma-separated aggregation methods (e.g. "mean,max"); all of them
+    # are computed from a single read of each year's monthly rasters
     year_agg_method: str
     overwrite_downloads: bool
     verify_existing_downloads: bool
     overwrite_processing: bool
 
 
-def aggregate_rasters(file_list, method="mean"):
-    """Aggregate multiple rasters
-
-    Aggregates multiple rasters with same features (dimensions, transform,
-    pixel size, etc.) and creates single layer using aggregation method
-    specified.
-
-    Supported methods: mean (default), max, min, sum
-
-    Arguments
-        file_list (list): list of file paths for rasters to be aggregated
-        method (str): method used for aggregation
-
-    Return
-        result: rasterio Raster instance
-    """
-
-    store = None
-    for ix, file_path in enumerate(file_list):
-
-        try:
-            raster = rasterio.open(file_path)
-        except:
-            print("Could not include file in aggregation ({0})".format(file_path))
-            continue
-
-        active = raster.read(masked=True)
-
-        if store is None:
-            store = active.copy()
-
-        else:
-            # make sure dimensions match
-            if active.shape != store.shape:
-                raise Exception("Dimensions of rasters do not match")
-
-            if method == "max":
-                store = np.ma.array((store, active)).max(axis=0)
-
-                # non masked array alternatives
-                # store = np.maximum.reduce([store, active])
-                # store = np.vstack([store, active]).max(axis=0)
-
-            elif method == "mean":
-                if ix == 1:
-                    weights = (~store.mask).astype(int)
-
-                store = np.ma.average(
-                    np.ma.array((store, active)),
-                    axis=0,
-                    weights=[weights, (~active.mask).astype(int)],
-                )
-                weights += (~active.mask).astype(int)
-
-            elif method == "min":
-                store = np.ma.array((store, active)).min(axis=0)
-
-            elif method == "sum":
-                store = np.ma.array((store, active)).sum(axis=0)
-
-            else:
-                raise Exception("Invalid method")
-
-    store = store.filled(raster.nodata)
-    return store, dict(raster.meta)
-
-
 def export_raster(data, path, meta, **kwargs):
     """
     Export raster array to geotiff
@@ -136,7 +76,9 @@ class GPM(Dataset):
     def __init__(self, config: GPMConfiguration):
 
         self.version = config.version
-        self.year_agg_method = config.year_agg_method
+        self.year_agg_methods = [
+            v.strip() for v in config.year_agg_method.split(",") if v.strip()
+        ]
         self.years = [int(v.strip()) for v in config.years.split(",") if v.strip()]
         self.email = config.email
 
@@ -144,7 +86,7 @@ class GPM(Dataset):
         self.output_dir = Path(config.output_dir) / self.version
 
         self.monthly_dir = self.output_dir / "monthly"
-        self.yearly_dir = self.output_dir / "yearly" / config.year_agg_method
+        self.yearly_dir = self.output_dir / "yearly"
 
         # skip existing files while downloading?
         self.overwrite_downloads = config.overwrite_downloads
@@ -279,11 +221,14 @@ class GPM(Dataset):
 
     def run_yearly_data(self, year, year_files, **kwargs):
         # year, year_files = task
-        data, meta = aggregate_rasters(
-            file_list=year_files, method=self.year_agg_method
+        results, meta = aggregate_rasters(
+            file_list=year_files, methods=self.year_agg_methods
         )
-        year_path = Path(self.yearly_dir) / self.year_mask.replace("YYYY", str(year))
-        export_raster(data, year_path, meta)
+        for method, data in results.items():
+            year_path = (
+                self.yearly_dir / method / self.year_mask.replace("YYYY", str(year))
+            )
+            export_raster(np.array([data]), year_path, dict(meta))
 
     def main(self):
 
@@ -316,7 +261,8 @@ class GPM(Dataset):
 
         logger.info("Running Yearly Aggregations")
         yearly_task_list = self.build_year_tasks()
-        self.yearly_dir.mkdir(parents=True, exist_ok=True)
+        for method in self.year_agg_methods:
+            (self.yearly_dir / method).mkdir(parents=True, exist_ok=True)
         year_run = self.run_tasks(
             self.run_yearly_data, yearly_task_list, force_sequential=True
         )
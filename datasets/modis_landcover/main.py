@@ -9,8 +9,11 @@ Data source: https://lpdaac.usgs.gov/products/mcd12q1v061/
 CMR concept:  C2484079608-LPCLOUD
 """
 
+import functools
+import os
 import re
 import shutil
+import xml.etree.ElementTree as ET
 from pathlib import Path
 from typing import Optional
 
@@ -18,8 +21,8 @@ import rasterio
 import requests
 from data_manager import BaseDatasetConfiguration, Dataset, get_config
 from pyhdf.SD import SD, SDC
-from rasterio.merge import merge as merge_tiles
-from rasterio.transform import array_bounds, from_bounds
+from rasterio.transform import from_bounds, from_origin
+from rasterio.windows import Window
 from rasterio.warp import Resampling, calculate_default_transform, reproject
 
 
@@ -31,6 +34,27 @@ EOS_GRID_NAME = "MCD12Q1"
 # actually at the path - confirmed against known-good, known-missing, and
 # corrupted files alike), so tiles are read directly with pyhdf instead.
 SINUSOIDAL_CRS = "+proj=sinu +lon_0=0 +x_0=0 +y_0=0 +R=6371007.181 +units=m +no_defs"
+# MODIS tiles sit on a fixed grid of 36 x 18 tiles over the sinusoidal
+# projection, so a tile's extent follows from its h/v ID in the file name
+# (e.g. "MCD12Q1.A2001001.h08v05.061.2022146024956.hdf").
+MODIS_GRID_ULX = -20015109.354
+MODIS_GRID_ULY = 10007554.677
+MODIS_TILE_SIZE = 2 * -MODIS_GRID_ULX / 36
+TILE_ID_PATTERN = re.compile(r"\.h(\d{2})v(\d{2})\.")
+
+
+@functools.lru_cache(maxsize=None)
+def modis_tile_extent(h: int, v: int) -> tuple[float, float, float, float]:
+    """(ulx, uly, lrx, lry) extent, in projected meters, of MODIS tile hXXvYY,
+    rounded like the extents in HDF-EOS StructMetadata."""
+    ulx = MODIS_GRID_ULX + h * MODIS_TILE_SIZE
+    uly = MODIS_GRID_ULY - v * MODIS_TILE_SIZE
+    return (
+        round(ulx, 6),
+        round(uly, 6),
+        round(ulx + MODIS_TILE_SIZE, 6),
+        round(uly - MODIS_TILE_SIZE, 6),
+    )
 
 
 class MCD12Q1Configuration(BaseDatasetConfiguration):
@@ -47,6 +71,14 @@ class MCD12Q1Configuration(BaseDatasetConfiguration):
     overwrite_download: bool
     overwrite_processing: bool
     overwrite_mosaic: bool
+    # Threads GDAL warps each year's mosaic to WGS84 with (0 uses all cores)
+    warp_threads: int = 0
+    # Memory, in MB, GDAL may use for each chunk of the warp; bounds the
+    # peak memory of a yearly mosaic regardless of its size
+    warp_mem_limit: int = 512
+    # Extract each year's tiles straight into windows of a local sinusoidal
+    # mosaic, instead of writing (and reading back) a GeoTIFF per tile
+    direct_mosaic: bool = False
 
 
 class MCD12Q1(Dataset):
@@ -62,6 +94,9 @@ class MCD12Q1(Dataset):
         self.overwrite_download = config.overwrite_download
         self.overwrite_processing = config.overwrite_processing
         self.overwrite_mosaic = config.overwrite_mosaic
+        self.warp_threads = config.warp_threads
+        self.warp_mem_limit = config.warp_mem_limit
+        self.direct_mosaic = config.direct_mosaic
 
         self.raw_dir.mkdir(parents=True, exist_ok=True)
         self.process_dir.mkdir(parents=True, exist_ok=True)
@@ -177,6 +212,27 @@ class MCD12Q1(Dataset):
         lrx, lry = float(lr.group(1)), float(lr.group(2))
         return ulx, uly, lrx, lry
 
+    @classmethod
+    def tile_extent(cls, hdf_path: Path, hdf: Optional[SD] = None) -> tuple[float, float, float, float]:
+        """(ulx, uly, lrx, lry) extent of a tile, from the tile index for its
+        h/v ID, or parsed from the file's StructMetadata if its name has none."""
+        match = TILE_ID_PATTERN.search(Path(hdf_path).name)
+        if match:
+            return modis_tile_extent(int(match.group(1)), int(match.group(2)))
+        if hdf is None:
+            raise ValueError(f"No MODIS tile ID in file name: {Path(hdf_path).name}")
+        return cls.parse_grid_extent(hdf, EOS_GRID_NAME)
+
+    def read_tile(self, hdf_path: Path):
+        """Read the land cover subdataset and extent of one HDF4 tile."""
+        hdf = SD(Path(hdf_path).as_posix(), SDC.READ)
+        try:
+            data = hdf.select(self.lc_type).get()
+            extent = self.tile_extent(hdf_path, hdf)
+        finally:
+            hdf.end()
+        return data, extent
+
     def process_tile(self, hdf_path: Path, tile_tif: Path):
         """Extract land cover subdataset from one HDF4 tile to GeoTIFF."""
         logger = self.get_logger()
@@ -186,9 +242,7 @@ class MCD12Q1(Dataset):
             return
         tmp = tile_tif.with_suffix(".tmp.tif")
         try:
-            hdf = SD(hdf_path.as_posix(), SDC.READ)
-            data = hdf.select(self.lc_type).get()
-            ulx, uly, lrx, lry = self.parse_grid_extent(hdf, EOS_GRID_NAME)
+            data, (ulx, uly, lrx, lry) = self.read_tile(hdf_path)
             height, width = data.shape
             transform = from_bounds(ulx, lry, lrx, uly, width, height)
             meta = {
@@ -220,6 +274,90 @@ class MCD12Q1(Dataset):
             tasks.append((tile_dir, output_tif))
         return tasks
 
+    @staticmethod
+    def build_vrt(tiles: list[Path], vrt_path: Path):
+        """
+        Write a VRT mosaicking tiles that share a CRS, resolution and grid,
+        without reading any of their pixels. 255 is nodata both in the tiles
+        (transparent where tiles overlap) and in the mosaic background.
+        """
+        infos = []
+        for t in tiles:
+            with rasterio.open(t) as src:
+                infos.append((t, src.transform, src.width, src.height))
+                crs, dtype = src.crs, src.dtypes[0]
+        xres, yres = infos[0][1].a, -infos[0][1].e
+        left = min(tr.c for _, tr, _, _ in infos)
+        top = max(tr.f for _, tr, _, _ in infos)
+        right = max(tr.c + w * xres for _, tr, w, _ in infos)
+        bottom = min(tr.f - h * yres for _, tr, _, h in infos)
+        width = round((right - left) / xres)
+        height = round((top - bottom) / yres)
+
+        vrt = ET.Element("VRTDataset", rasterXSize=str(width), rasterYSize=str(height))
+        ET.SubElement(vrt, "SRS").text = crs.to_wkt()
+        ET.SubElement(vrt, "GeoTransform").text = ", ".join(
+            repr(v) for v in (left, xres, 0.0, top, 0.0, -yres)
+        )
+        gdal_type = rasterio.dtypes.typename_fwd[rasterio.dtypes.dtype_rev[dtype]]
+        band = ET.SubElement(vrt, "VRTRasterBand", dataType=gdal_type, band="1")
+        ET.SubElement(band, "NoDataValue").text = "255"
+        for t, tr, w, h in infos:
+            source = ET.SubElement(band, "ComplexSource")
+            ET.SubElement(source, "SourceFilename", relativeToVRT="0").text = str(t)
+            ET.SubElement(source, "SourceBand").text = "1"
+            ET.SubElement(source, "SrcRect", xOff="0", yOff="0", xSize=str(w), ySize=str(h))
+            ET.SubElement(
+                source,
+                "DstRect",
+                xOff=str(round((tr.c - left) / xres)),
+                yOff=str(round((top - tr.f) / yres)),
+                xSize=str(w),
+                ySize=str(h),
+            )
+            ET.SubElement(source, "NODATA").text = "255"
+        ET.ElementTree(vrt).write(vrt_path)
+
+    def warp_to_wgs84(self, mosaic_path: Path, output_tif: Path):
+        """Reproject a sinusoidal mosaic to a WGS84 GeoTIFF.
+
+        Nearest-neighbor preserves integer class values. GDAL warps the
+        mosaic chunk by chunk straight into the output, within
+        warp_mem_limit, so it's never read into memory whole.
+        """
+        tmp_wgs84 = self.process_dir / (output_tif.stem + "_wgs84.tmp.tif")
+        try:
+            with rasterio.open(mosaic_path) as mosaic:
+                dst_transform, dst_width, dst_height = calculate_default_transform(
+                    mosaic.crs, "EPSG:4326", mosaic.width, mosaic.height, *mosaic.bounds
+                )
+                dst_meta = {
+                    "driver": "GTiff",
+                    "dtype": "uint8",
+                    "count": 1,
+                    "crs": "EPSG:4326",
+                    "transform": dst_transform,
+                    "width": dst_width,
+                    "height": dst_height,
+                    "nodata": 255,
+                    "compress": "LZW",
+                    "tiled": True,
+                    "bigtiff": "YES",
+                }
+                with rasterio.open(tmp_wgs84, "w", **dst_meta) as dst:
+                    reproject(
+                        source=rasterio.band(mosaic, 1),
+                        destination=rasterio.band(dst, 1),
+                        src_nodata=255,
+                        dst_nodata=255,
+                        resampling=Resampling.nearest,
+                        num_threads=self.warp_threads or os.cpu_count(),
+                        warp_mem_limit=self.warp_mem_limit,
+                    )
+            shutil.move(str(tmp_wgs84), output_tif)
+        finally:
+            tmp_wgs84.unlink(missing_ok=True)
+
     def mosaic_year(self, tile_dir: Path, output_tif: Path):
         """Mosaic all tiles for one year (SIN) and reproject to WGS84."""
         logger = self.get_logger()
@@ -233,58 +371,99 @@ class MCD12Q1(Dataset):
             logger.warning(f"No tiles to mosaic in {tile_dir}")
             return
 
-        tmp_wgs84 = self.process_dir / (output_tif.stem + "_wgs84.tmp.tif")
+        vrt_path = self.process_dir / (output_tif.stem + "_sin.vrt")
         try:
-            # Mosaic in native MODIS sinusoidal projection. nodata=255 both
-            # marks 255 pixels in the inputs as transparent (skip on overlap)
-            # and fills the output background with 255, matching the old
+            # Mosaic in native MODIS sinusoidal projection as a VRT, so tiles
+            # are only read as the warp needs them. nodata=255 both marks 255
+            # pixels in the inputs as transparent (skip on overlap) and fills
+            # the output background with 255, matching the old
             # `-init 255 -n 255` gdal_merge.py behavior.
-            srcs = [rasterio.open(t) for t in tiles]
-            try:
-                mosaic_data, mosaic_transform = merge_tiles(srcs, nodata=255)
-                src_crs = srcs[0].crs
-            finally:
-                for s in srcs:
-                    s.close()
+            self.build_vrt(tiles, vrt_path)
             logger.info(f"Mosaicked {len(tiles)} tiles for {output_tif.stem}")
 
-            # Reproject SIN → WGS84; nearest-neighbor preserves integer class values
-            _, height, width = mosaic_data.shape
-            sin_bounds = array_bounds(height, width, mosaic_transform)
-            dst_transform, dst_width, dst_height = calculate_default_transform(
-                src_crs, "EPSG:4326", width, height, *sin_bounds
-            )
-            dst_meta = {
-                "driver": "GTiff",
-                "dtype": "uint8",
-                "count": 1,
-                "crs": "EPSG:4326",
-                "transform": dst_transform,
-                "width": dst_width,
-                "height": dst_height,
-                "nodata": 255,
-                "compress": "LZW",
-                "tiled": True,
-                "bigtiff": "YES",
-            }
-            with rasterio.open(tmp_wgs84, "w", **dst_meta) as dst:
-                reproject(
-                    source=mosaic_data[0],
-                    destination=rasterio.band(dst, 1),
-                    src_transform=mosaic_transform,
-                    src_crs=src_crs,
-                    dst_transform=dst_transform,
-                    dst_crs="EPSG:4326",
-                    src_nodata=255,
-                    dst_nodata=255,
-                    resampling=Resampling.nearest,
-                )
-            shutil.move(str(tmp_wgs84), output_tif)
+            self.warp_to_wgs84(vrt_path, output_tif)
             logger.info(f"Reprojected to WGS84: {output_tif.name}")
         except Exception as e:
             raise RuntimeError(f"Mosaic/reproject failed for {output_tif.name}: {e}") from e
         finally:
-            tmp_wgs84.unlink(missing_ok=True)
+            vrt_path.unlink(missing_ok=True)
+
+    def build_direct_mosaic_list(self) -> list[tuple]:
+        tasks = []
+        for year in self.years:
+            year_raw = self.raw_dir / str(year)
+            output_tif = self.output_dir / f"mcd12q1_061_{self.lc_type.lower()}_{year}.tif"
+            tasks.append((year_raw, output_tif))
+        return tasks
+
+    def mosaic_year_direct(self, year_raw: Path, output_tif: Path):
+        """Extract all HDF4 tiles for one year straight into a sinusoidal
+        mosaic, without per-tile GeoTIFFs, and reproject it to WGS84."""
+        logger = self.get_logger()
+        year_raw, output_tif = Path(year_raw), Path(output_tif)
+        if output_tif.exists() and not self.overwrite_mosaic:
+            logger.info(f"Mosaic already exists: {output_tif.name}")
+            return
+
+        hdfs = sorted(year_raw.glob("*.hdf"))
+        if not hdfs:
+            logger.warning(f"No tiles to mosaic in {year_raw}")
+            return
+
+        # the mosaic's grid follows from the tile index alone; only the
+        # first tile is read up front, for its resolution and data type
+        extents = [self.tile_extent(hdf_path) for hdf_path in hdfs]
+        first, first_extent = self.read_tile(hdfs[0])
+        res = (first_extent[2] - first_extent[0]) / first.shape[1]
+        left = min(e[0] for e in extents)
+        top = max(e[1] for e in extents)
+        width = round((max(e[2] for e in extents) - left) / res)
+        height = round((top - min(e[3] for e in extents)) / res)
+
+        mosaic_path = self.process_dir / (output_tif.stem + "_sin.tmp.tif")
+        meta = {
+            "driver": "GTiff",
+            "dtype": str(first.dtype),
+            "count": 1,
+            "width": width,
+            "height": height,
+            "crs": SINUSOIDAL_CRS,
+            "transform": from_origin(left, top, res, res),
+            "nodata": 255,
+            "tiled": True,
+            # uncompressed, and blocks no tile is written to (ocean) are never
+            # allocated; they read back as nodata
+            "sparse_ok": True,
+            "bigtiff": "IF_SAFER",
+        }
+        try:
+            # tiles are read one at a time: the HDF4 library isn't thread-safe
+            with rasterio.open(mosaic_path, "w", **meta) as dst:
+                for hdf_path, extent in zip(hdfs, extents):
+                    if hdf_path == hdfs[0]:
+                        data = first
+                    else:
+                        try:
+                            data, _ = self.read_tile(hdf_path)
+                        except Exception as e:
+                            raise RuntimeError(
+                                f"Failed to extract subdataset for {hdf_path.name}: {e}"
+                            ) from e
+                    window = Window(
+                        round((extent[0] - left) / res),
+                        round((top - extent[1]) / res),
+                        data.shape[1],
+                        data.shape[0],
+                    )
+                    dst.write(data, 1, window=window)
+            logger.info(f"Mosaicked {len(hdfs)} tiles for {output_tif.stem}")
+
+            self.warp_to_wgs84(mosaic_path, output_tif)
+            logger.info(f"Reprojected to WGS84: {output_tif.name}")
+        except Exception as e:
+            raise RuntimeError(f"Mosaic/reproject failed for {output_tif.name}: {e}") from e
+        finally:
+            mosaic_path.unlink(missing_ok=True)
 
     # ── Orchestration ─────────────────────────────────────────────────────────
 
@@ -297,6 +476,14 @@ class MCD12Q1(Dataset):
         download = self.run_tasks(self.download_granule, download_list)
         self.log_run(download)
 
+        if self.direct_mosaic:
+            logger.info("=== Tile extraction, mosaic & reproject ===")
+            mosaic_list = self.build_direct_mosaic_list()
+            logger.info(f"Mosaicking {len(mosaic_list)} years")
+            mosaic = self.run_tasks(self.mosaic_year_direct, mosaic_list)
+            self.log_run(mosaic)
+            return
+
         logger.info("=== Tile extraction ===")
         process_list = self.build_process_list()
         logger.info(f"Extracting {len(process_list)} tiles")
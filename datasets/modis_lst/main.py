@@ -9,7 +9,6 @@ CMR concept:  C2565791021-LPCLOUD  (verify: https://cmr.earthdata.nasa.gov/searc
 """
 
 import os
-import shutil
 import warnings
 from pathlib import Path
 from typing import Optional, Union
@@ -18,7 +17,7 @@ import numpy as np
 import rasterio
 import requests
 from affine import Affine
-from data_manager import BaseDatasetConfiguration, Dataset, get_config
+from data_manager import BaseDatasetConfiguration, Dataset, cog_profile, get_config
 from pyhdf.SD import SD, SDC
 
 
@@ -107,7 +106,6 @@ def aggregate_rasters(file_list, method="mean"):
 
 
 class MODISLandSurfaceTempConfiguration(BaseDatasetConfiguration):
-    process_dir: str
     raw_dir: str
     output_dir: str
     # NASA Earthdata Login bearer token — stored in gitignored .env, not committed.
@@ -133,7 +131,6 @@ class MODISLandSurfaceTemp(Dataset):
         self.overwrite_monthly = config.overwrite_monthly
         self.overwrite_yearly = config.overwrite_yearly
 
-        self.process_dir = Path(config.process_dir)
         self.raw_dir = Path(config.raw_dir)
         self.output_dir = Path(config.output_dir)
 
@@ -212,32 +209,24 @@ class MODISLandSurfaceTemp(Dataset):
                 temporal = time_start[:7].replace("-", "")
                 hdf_name = Path(url).name
                 dst_path = self.raw_dir / f"{temporal}_{hdf_name}"
-                tmp_path = self.process_dir / f"{temporal}_{hdf_name}"
-                tasks.append((url, tmp_path, dst_path))
+                tasks.append((url, dst_path))
         return tasks
 
-    def download_file(self, url: str, tmp_file: Path, dst_file: Path):
+    def download_file(self, url: str, dst_file: Path):
         logger = self.get_logger()
-        dst_file, tmp_file = Path(dst_file), Path(tmp_file)
-        self.process_dir.mkdir(parents=True, exist_ok=True)
+        dst_file = Path(dst_file)
 
         if dst_file.exists() and not self.overwrite_download:
             logger.info(f"File already exists: {dst_file}. Skipping...")
             return
 
-        tmp_file.parent.mkdir(parents=True, exist_ok=True)
-        try:
+        with self.tmp_to_dst_file(dst_file, make_dst_dir=True) as tmp_file:
             with requests.get(url, headers=self.auth_headers, stream=True, timeout=300) as r:
                 r.raise_for_status()
                 with open(tmp_file, "wb") as f:
                     for chunk in r.iter_content(chunk_size=1024 * 1024):
                         f.write(chunk)
-            logger.info(f"Downloaded to tmp: {url} > {tmp_file}")
-            shutil.copyfile(tmp_file, dst_file)
-            logger.info(f"Copied to dst: {tmp_file} > {dst_file}")
-        except Exception:
-            tmp_file.unlink(missing_ok=True)
-            raise
+        logger.info(f"Downloaded: {url} > {dst_file}")
 
     # ── Processing (unchanged) ────────────────────────────────────────────────
 
@@ -249,7 +238,8 @@ class MODISLandSurfaceTemp(Dataset):
             (self.output_dir / "monthly" / l_time).mkdir(parents=True, exist_ok=True)
 
             for p in self.raw_dir.iterdir():
-                if p.suffix == ".hdf":
+                # hidden files are downloads still in progress, see tmp_to_dst_file
+                if p.suffix == ".hdf" and not p.name.startswith("."):
                     temporal = p.name.split("_")[0]
                     output_path = (
                         self.output_dir
@@ -257,17 +247,13 @@ class MODISLandSurfaceTemp(Dataset):
                         / l_time
                         / f"modis_lst_{l_time}_cmg_{temporal}.tif"
                     )
-                    tmp_path = (
-                        self.process_dir / f"modis_lst_{l_time}_cmg_{temporal}.tif"
-                    )
 
-                    flist.append([p, layer, tmp_path, output_path])
+                    flist.append([p, layer, output_path])
 
         return flist
 
-    def process_hdf(self, input_path: Union[str, Path], layer, tmp_path, output_path):
+    def process_hdf(self, input_path: Union[str, Path], layer, output_path):
         logger = self.get_logger()
-        self.process_dir.mkdir(parents=True, exist_ok=True)
 
         # pyhdf doesn't accept pathlib.Path objects
         if isinstance(input_path, Path):
@@ -281,16 +267,16 @@ class MODISLandSurfaceTemp(Dataset):
             # 5600m / 0.05 degree resolution, global coverage
             transform = Affine(0.05, 0, -180, 0, -0.05, 90)
             meta = {
+                **cog_profile(data.dtype),
                 "transform": transform,
                 "nodata": 0,
                 "height": data.shape[0],
                 "width": data.shape[1],
             }
-            export_raster(np.array([data]), tmp_path, meta, quiet=True)
+            with self.tmp_to_dst_file(output_path, make_dst_dir=True) as tmp_path:
+                export_raster(np.array([data]), tmp_path, meta, quiet=True)
 
-            logger.info(f"Processed to tmp: {input_path} > {tmp_path}")
-            shutil.copyfile(tmp_path, output_path)
-            logger.info(f"Copied to dst: {tmp_path} > {output_path}")
+            logger.info(f"Processed: {input_path} > {output_path}")
 
         else:
             logger.info(f"{output_path} already exists, skipping...")
@@ -306,7 +292,9 @@ class MODISLandSurfaceTemp(Dataset):
 
         for data_class in data_class_list:
             month_files = [
-                c for c in (src_dir / data_class).iterdir() if c.suffix == ".tif"
+                c
+                for c in (src_dir / data_class).iterdir()
+                if c.suffix == ".tif" and not c.name.startswith(".")
             ]
             year_months = {}
 
@@ -324,28 +312,21 @@ class MODISLandSurfaceTemp(Dataset):
                     / self.method
                     / f"modis_lst_{data_class}_cmg_{year_group}.tif"
                 )
-                tmp_path = (
-                    self.process_dir
-                    / f"{self.method}_modis_lst_{data_class}_cmg_{year_group}.tif"
-                )
 
-                flist.append(
-                    (year_group, self.method, month_paths, tmp_path, output_path)
-                )
+                flist.append((year_group, self.method, month_paths, output_path))
 
         return flist
 
-    def run_yearly_data(self, year, method, year_files, tmp_path, out_path):
+    def run_yearly_data(self, year, method, year_files, out_path):
         logger = self.get_logger()
-        self.process_dir.mkdir(parents=True, exist_ok=True)
 
         if not os.path.isfile(out_path) or self.overwrite_yearly:
             data, meta = aggregate_rasters(file_list=year_files, method=method)
-            export_raster(data, tmp_path, meta)
+            meta.update(cog_profile(meta["dtype"]))
+            with self.tmp_to_dst_file(out_path, make_dst_dir=True) as tmp_path:
+                export_raster(data, tmp_path, meta)
 
-            logger.info(f"Processed to tmp: {year}_{method} > {tmp_path}")
-            shutil.copyfile(tmp_path, out_path)
-            logger.info(f"Copied to dst: {tmp_path} > {out_path}")
+            logger.info(f"Processed: {year}_{method} > {out_path}")
 
         else:
             logger.info(f"{out_path} already exists, skipping...")
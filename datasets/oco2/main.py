@@ -1,5 +1,6 @@
 import glob
 import os
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 
 import h5py
@@ -9,7 +10,8 @@ import rasterio
 import requests
 from affine import Affine
 from data_manager import BaseDatasetConfiguration, Dataset, get_config
-from scipy.interpolate import griddata
+from scipy.interpolate import CloughTocher2DInterpolator, LinearNDInterpolator
+from scipy.spatial import Delaunay, cKDTree
 
 from utility import file_exists, find_files, get_current_timestamp
 
@@ -34,7 +36,15 @@ class OCO2Configuration(BaseDatasetConfiguration):
     # Prefect run form renders a text input rather than the array widget,
     # whose "add item" button submits the form.
     year_list: str
+    # "linear" or "cubic" (Delaunay based, as with scipy's griddata),
+    # "nearest" (KD-tree nearest neighbor) or "idw" (KD-tree inverse distance
+    # weighting over the idw_neighbors nearest points)
     interp_method: str
+    # threads used to evaluate the interpolation over latitude bands of the
+    # output grid; 0 splits the available cores between concurrent tasks
+    interp_workers: int = 0
+    idw_neighbors: int = 8
+    idw_power: float = 2.0
     run_a: bool
     run_b: bool
     run_c: bool
@@ -54,6 +64,9 @@ class OCO2(Dataset):
         self.timestamp = get_current_timestamp("%Y_%m_%d_%H_%M")
 
         self.interp_method = config.interp_method
+        self.interp_workers = config.interp_workers
+        self.idw_neighbors = config.idw_neighbors
+        self.idw_power = config.idw_power
         self.data_base_url = config.data_base_url
         self.base_version = config.base_version
         self.recent_version = config.recent_version
@@ -233,46 +246,67 @@ class OCO2(Dataset):
             self.concat_data(flist, out_path)
 
     @staticmethod
-    def round_to(value, interval):
-        """round value to nearest interval of a decimal value
-        e.g., every 0.25
+    def grid_aggregate(lon, lat, values, rnd_interval=0.1):
+        """aggregate point values to a regular global grid
+
+        Each point is assigned to the nearest grid point (every `rnd_interval`
+        degrees, from -180 to 180 and 90 to -90, the same grid used by
+        `interpolate`) using integer cell indices, so the aggregation is a
+        pair of `np.bincount` calls rather than a per-point groupby key.
+
+        Returns a tuple of 2D (mean, count) arrays, where row 0 is 90 degrees
+        latitude and column 0 is -180 degrees longitude. Cells without any
+        points have a count of 0 and a mean of NaN.
         """
-        if interval > 1:
+        if rnd_interval > 1:
             raise ValueError(
                 "Must provide float less than (or equal to) 1 indicating interval to round to"
             )
-        return round(value * (1 / interval)) * interval
+        steps = round(1 / rnd_interval)
+        nrows = 180 * steps + 1
+        ncols = 360 * steps + 1
 
-    @staticmethod
-    def lonlat(lon, lat, dlen):
-        """
-        Create unique id string combining latitude and longitude
-        """
-        str_lon = format(lon, "0.{}f".format(dlen))
-        str_lat = format(lat, "0.{}f".format(dlen))
-        lon_lat = "{}_{}".format(str_lon, str_lat)
-        return lon_lat
+        lon = np.asarray(lon, dtype=np.float64)
+        lat = np.asarray(lat, dtype=np.float64)
+        values = np.asarray(values, dtype=np.float64)
+
+        valid = np.isfinite(lon) & np.isfinite(lat) & np.isfinite(values)
+        cols = np.rint(lon[valid] * steps).astype(np.int64) + 180 * steps
+        rows = 90 * steps - np.rint(lat[valid] * steps).astype(np.int64)
+        cells = rows * ncols + cols
+
+        count = np.bincount(cells, minlength=nrows * ncols)
+        total = np.bincount(cells, weights=values[valid], minlength=nrows * ncols)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            mean = total / count
+
+        return mean.reshape(nrows, ncols), count.reshape(nrows, ncols)
 
     def agg_to_grid(self, input_path, output_path, rnd_interval=0.1):
         """aggregate coordinates to regular grid points"""
         decimal_places = len(str(rnd_interval).split(".")[1])
         df = self.read_csv(input_path)
-        df = df.loc[df["xco2_quality_flag"] == 0].copy(deep=True)
-        df["lon"] = df["lon"].apply(lambda z: self.round_to(z, rnd_interval))
-        df["lat"] = df["lat"].apply(lambda z: self.round_to(z, rnd_interval))
-        df["lonlat"] = df.apply(
-            lambda z: self.lonlat(z["lon"], z["lat"], decimal_places), axis=1
+        df = df.loc[df["xco2_quality_flag"] == 0]
+        mean, count = self.grid_aggregate(
+            df["lon"].to_numpy(), df["lat"].to_numpy(), df["xco2"].to_numpy(), rnd_interval
+        )
+        # only occupied cells are written out, as points for interpolation
+        rows, cols = np.nonzero(count)
+        lon = np.round(cols * rnd_interval - 180.0, decimal_places)
+        lat = np.round(90.0 - rows * rnd_interval, decimal_places)
+        fmt = f"%0.{decimal_places}f"
+        lonlat = np.char.add(
+            np.char.add(np.char.mod(fmt, lon), "_"), np.char.mod(fmt, lat)
+        )
+        agg_df = pd.DataFrame(
+            {
+                "lonlat": lonlat,
+                "xco2": mean[rows, cols],
+                "count": count[rows, cols],
+                "lon": lon,
+                "lat": lat,
+            }
         )
-        agg_ops = {
-            "xco2": "mean",
-            "xco2_quality_flag": "count",
-            "lon": "first",
-            "lat": "first",
-        }
-        agg_df = df.groupby("lonlat", as_index=False).agg(agg_ops)
-        agg_df.columns = [
-            i.replace("xco2_quality_flag", "count") for i in agg_df.columns
-        ]
         agg_df.to_csv(output_path, index=False, encoding="utf-8")
 
     def agg_to_grid_month(self, input_path, output_path):
@@ -297,24 +331,92 @@ class OCO2(Dataset):
             logger.info("Agg {}".format(output_path))
             self.agg_to_grid(input_path, output_path)
 
+    def build_interpolator(self, points, values, interp_method):
+        """Build a function that interpolates values at points onto an
+        (n, 2) array of lon/lat coordinates
+        """
+        if interp_method in ("linear", "cubic"):
+            tri = Delaunay(points)
+            if interp_method == "linear":
+                return LinearNDInterpolator(tri, values)
+            return CloughTocher2DInterpolator(tri, values)
+
+        elif interp_method in ("nearest", "idw"):
+            tree = cKDTree(points)
+
+            if interp_method == "nearest":
+
+                def interpolator(coords):
+                    _, idx = tree.query(coords, k=1)
+                    return values[idx]
+
+            else:
+                k = min(self.idw_neighbors, len(points))
+                power = self.idw_power
+
+                def interpolator(coords):
+                    dist, idx = tree.query(coords, k=k)
+                    dist = dist.reshape(len(coords), k)
+                    idx = idx.reshape(len(coords), k)
+                    with np.errstate(divide="ignore"):
+                        weights = 1.0 / dist**power
+                    # coordinates that coincide with a point take its value
+                    exact = dist[:, 0] == 0
+                    weights[exact] = 0
+                    weights[exact, 0] = 1
+                    return (weights * values[idx]).sum(axis=1) / weights.sum(axis=1)
+
+            return interpolator
+
+        else:
+            raise ValueError(f"Invalid interpolation method: {interp_method}")
+
     def interpolate(
-        self, input_path, output_path, rnd_interval=0.1, interp_method="linear"
+        self,
+        input_path,
+        output_path,
+        rnd_interval=0.1,
+        interp_method="linear",
+        band_rows=100,
     ):
-        """interpolate
+        """interpolate gridded points to a full global grid
+
+        The output grid is evaluated in bands of `band_rows` latitude rows,
+        spread over `self.interp_workers` threads (scipy releases the GIL
+        while evaluating both Delaunay and KD-tree interpolators). If that is
+        0, the available cores are split evenly between the tasks run at once.
+
         https://docs.scipy.org/doc/scipy/reference/generated/scipy.interpolate.griddata.html#scipy.interpolate.griddata
         https://earthscience.stackexchange.com/questions/12057/how-to-interpolate-scattered-data-to-a-regular-grid-in-python
         """
         data = self.read_csv(input_path)
         # data coordinates and values
-        x = data["lon"]
-        y = data["lat"]
-        z = data["xco2"]
+        points = data[["lon", "lat"]].to_numpy(dtype=np.float64)
+        values = data["xco2"].to_numpy(dtype=np.float64)
+        interpolator = self.build_interpolator(points, values, interp_method)
         # target grid to interpolate to
         xi = np.arange(-180.0, 180.0 + rnd_interval, rnd_interval)
         yi = np.arange(90.0, -90.0 - rnd_interval, -rnd_interval)
-        xi, yi = np.meshgrid(xi, yi)
-        # interpolate
-        zi = griddata((x, y), z, (xi, yi), method=interp_method)
+        zi = np.empty((len(yi), len(xi)), dtype=np.float64)
+
+        def interpolate_band(start):
+            band_xi, band_yi = np.meshgrid(xi, yi[start : start + band_rows])
+            coords = np.column_stack((band_xi.ravel(), band_yi.ravel()))
+            zi[start : start + band_rows] = interpolator(coords).reshape(band_xi.shape)
+
+        interp_workers = self.interp_workers
+        if not interp_workers:
+            # up to max_workers tasks interpolate at the same time, so giving
+            # each of them every core would oversubscribe the machine
+            concurrent_tasks = 1 if self.backend == "serial" else self.max_workers
+            interp_workers = max(
+                1, os.cpu_count() // (concurrent_tasks or os.cpu_count())
+            )
+
+        with ThreadPoolExecutor(max_workers=interp_workers) as pool:
+            # list() so exceptions raised in a band are re-raised here
+            list(pool.map(interpolate_band, range(0, len(yi), band_rows)))
+
         # prepare raster
         transform = Affine(rnd_interval, 0, -180.0, 0, -rnd_interval, 90.0)
         meta = {
@@ -332,11 +434,11 @@ class OCO2(Dataset):
 
     def interpolate_month(self, input_path, output_path):
         print("Interpolating {}".format(output_path))
-        self.interpolate(input_path, output_path)
+        self.interpolate(input_path, output_path, interp_method=self.interp_method)
 
     def interpolate_year(self, input_path, output_path):
         print("Interpolating {}".format(output_path))
-        self.interpolate(input_path, output_path)
+        self.interpolate(input_path, output_path, interp_method=self.interp_method)
 
     def output_results(self, tasks, results, stage):
         """Format and output results from running tasks
@@ -4,13 +4,11 @@
 import os
 from pathlib import Path
 
-import geopandas as gpd
+import numpy as np
 import pandas as pd
 import rasterio
 import requests
-from data_manager import BaseDatasetConfiguration, Dataset, get_config
-from rasterio import features
-from shapely.geometry import Point
+from data_manager import BaseDatasetConfiguration, Dataset, file_key, get_config
 
 
 class PLADConfiguration(BaseDatasetConfiguration):
@@ -42,6 +40,12 @@ class PLAD(Dataset):
 
         self.src_path = self.raw_dir / "plad.tab"
 
+        self.pixel_size = 0.05
+        self.transform = rasterio.transform.from_origin(
+            -180, 90, self.pixel_size, self.pixel_size
+        )
+        self.shape = (int(180 / self.pixel_size), int(360 / self.pixel_size))
+
     def test_connection(self):
         # test connection
         test_request = requests.get(self.dataset_url, verify=True)
@@ -78,69 +82,105 @@ class PLAD(Dataset):
                             f"Attempt {str(attempts)} : {str(self.download_url)}"
                         )
 
-    def process_year(self, year):
-        """create file for each year"""
-
+    def load_points(self):
+        """
+        Parse the source file into typed arrays of the grid cell and
+        leadership years of every leader with a usable birthplace
+        """
         logger = self.get_logger()
 
-        output_filename = f"leader_birthplace_data_{year}.tif"
-        output_path = self.output_dir / output_filename
-
-        if os.path.isfile(output_path) and not self.overwrite_output:
-            logger.info(f"File exists: {str(output_path)}")
-            return ("File exists", str(output_path))
-
         if not os.path.isfile(self.src_path):
             logger.info(f"Error: Master data download: {self.src_path} not found")
             raise Exception(f"Data file not found: {self.src_path}")
 
-        src_df = pd.read_csv(self.src_path, sep="\t", low_memory=False)
+        src_df = pd.read_csv(
+            self.src_path,
+            sep="\t",
+            usecols=[
+                "longitude",
+                "latitude",
+                "foreign_leader",
+                "geo_precision",
+                "startyear",
+                "endyear",
+            ],
+            low_memory=False,
+        )
+        # missing values are recorded as "."
+        src_df = src_df.apply(pd.to_numeric, errors="coerce")
 
         # adm2 or finer precision
         # valid lat/lon and not foreign leader
         df = src_df.loc[
-            (src_df.longitude != ".")
-            & (src_df.latitude != ".")
-            & (src_df.foreign_leader.isin([0, "0"]))
-            & (src_df.geo_precision.isin([1, 2, 3]))
-        ].copy()
-
-        df = df.loc[(df.startyear <= year) & (df.endyear >= year)].copy()
-
-        df["geometry"] = df.apply(lambda x: Point(x.longitude, x.latitude), axis=1)
-
-        gdf = gpd.GeoDataFrame(df, geometry="geometry")
-        gdf = gdf.set_crs(epsg=4326)
-
-        pixel_size = 0.05
-        transform = rasterio.transform.from_origin(-180, 90, pixel_size, pixel_size)
-        shape = (int(180 / pixel_size), int(360 / pixel_size))
-
-        rasterized = features.rasterize(
-            gdf.geometry,
-            out_shape=shape,
-            fill=0,
-            out=None,
-            transform=transform,
-            all_touched=True,
-            default_value=1,
-            dtype=None,
+            src_df.longitude.notna()
+            & src_df.latitude.notna()
+            & (src_df.foreign_leader == 0)
+            & src_df.geo_precision.isin([1, 2, 3])
+        ]
+
+        # cell containing each birthplace. Like GDAL rasterizing a point,
+        # coordinates within floating point error of a cell edge fall in the
+        # cell after it (e.g. 144.7 is in column 6494, not 6493.999...)
+        cols = np.floor(
+            (df.longitude.to_numpy() + 180) / self.pixel_size + 1e-9
+        ).astype(int)
+        rows = np.floor(
+            (90 - df.latitude.to_numpy()) / self.pixel_size + 1e-9
+        ).astype(int)
+        inside = (
+            (rows >= 0) & (rows < self.shape[0]) & (cols >= 0) & (cols < self.shape[1])
         )
 
-        with rasterio.open(
-            output_path,
-            "w",
-            driver="GTiff",
-            crs="EPSG:4326",
-            transform=transform,
-            dtype=rasterio.uint8,
-            count=1,
-            width=shape[1],
-            height=shape[0],
-        ) as dst:
-            dst.write(rasterized, indexes=1)
+        return (
+            rows[inside],
+            cols[inside],
+            df.startyear.to_numpy()[inside],
+            df.endyear.to_numpy()[inside],
+        )
+
+    def write_year(self, year, points):
+        """write the raster of birthplaces of leaders in office during a year"""
+
+        logger = self.get_logger()
+
+        output_path = self.output_path(year)
+
+        if os.path.isfile(output_path) and not self.overwrite_output:
+            logger.info(f"File exists: {str(output_path)}")
+            return ("File exists", str(output_path))
+
+        rows, cols, startyear, endyear = points
+        in_office = (startyear <= year) & (endyear >= year)
+
+        rasterized = np.zeros(self.shape, dtype=np.uint8)
+        rasterized[rows[in_office], cols[in_office]] = 1
+
+        with self.tmp_to_dst_file(output_path) as tmp_path:
+            with rasterio.open(
+                tmp_path,
+                "w",
+                driver="GTiff",
+                crs="EPSG:4326",
+                transform=self.transform,
+                dtype=rasterio.uint8,
+                count=1,
+                width=self.shape[1],
+                height=self.shape[0],
+            ) as dst:
+                dst.write(rasterized, indexes=1)
 
         logger.info(f"Data Compiled: {str(year)}")
+        return ("Success", str(output_path))
+
+    def output_path(self, year):
+        return self.output_dir / f"leader_birthplace_data_{year}.tif"
+
+    def process_year(self, year):
+        """create file for each year, parsing the source file only once per worker"""
+        points = None
+        if self.overwrite_output or not self.output_path(year).exists():
+            points = self.cached(("plad", file_key(self.src_path)), self.load_points)
+        return self.write_year(year, points)
 
     def main(self):
 
@@ -11,7 +11,7 @@ import numpy as np
 import rasterio
 from affine import Affine
 from boxsdk import Client, JWTAuth
-from data_manager import BaseDatasetConfiguration, Dataset, get_config
+from data_manager import BaseDatasetConfiguration, Dataset, cog_profile, get_config
 from netCDF4 import Dataset as NCDFDataset
 
 
@@ -318,14 +318,13 @@ class PM25(Dataset):
             data = np.flip(rootgrp.variables["GWRPM25"][:], axis=0)
 
             meta = {
-                "driver": "COG",
+                **cog_profile("float32"),
                 "dtype": "float32",
                 "nodata": data.fill_value,
                 "width": lon_size,
                 "height": lat_size,
                 "count": 1,
                 "crs": {"init": "epsg:4326"},
-                "compress": "lzw",
                 "transform": Affine(lon_res, 0.0, lon_min, 0.0, -lat_res, lat_max),
             }
 
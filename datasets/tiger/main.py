@@ -18,7 +18,7 @@ import pandas as pd
 import requests
 from pydantic import field_validator
 
-from data_manager import BaseDatasetConfiguration, Dataset, get_config
+from data_manager import BaseDatasetConfiguration, Dataset, get_config, write_vector
 
 
 class TIGERDownloadConfiguration(BaseDatasetConfiguration):
@@ -88,7 +88,8 @@ class TIGERDownloadDataset(Dataset):
             else:
                 gdf[column] = gdf[column].fillna("")
 
-        gdf.to_file(self.output_path, driver="GPKG")
+        with self.tmp_to_dst_file(self.output_path, make_dst_dir=True) as tmp:
+            write_vector(gdf, tmp, layer=self.output_path.stem)
         logger.info(f"Saved to {self.output_path}")
 
     def create_ingest_json(self):
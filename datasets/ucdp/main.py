@@ -8,6 +8,7 @@ roughly annually; download_url will need bumping when they do)
 
 """
 import json
+from contextlib import ExitStack
 from pathlib import Path
 from zipfile import ZipFile
 
@@ -16,7 +17,12 @@ import pandas as pd
 import requests
 from pydantic import field_validator
 
-from data_manager import BaseDatasetConfiguration, Dataset, get_config
+from data_manager import (
+    BaseDatasetConfiguration,
+    Dataset,
+    get_config,
+    write_vector_batches,
+)
 
 # the ingest json template checked into this dataset's directory
 FILTER_INGEST_TEMPLATE = Path(__file__).parent / "ged261_filter_ingest.json"
@@ -151,6 +157,10 @@ class UCDPConfiguration(BaseDatasetConfiguration):
     overwrite_download: bool
     overwrite_process: bool
     dataset: str
+    # number of events read from the CSV and written to the GPKG at a time
+    chunk_size: int = 100000
+    # also write the events to a GeoParquet file next to the GPKG
+    write_geoparquet: bool = False
 
     @field_validator("raw_dir", "output_dir")
     @classmethod
@@ -169,6 +179,8 @@ class UCDP(Dataset):
         self.overwrite_download = config.overwrite_download
         self.overwrite_process = config.overwrite_process
         self.dataset = config.dataset
+        self.chunk_size = config.chunk_size
+        self.write_geoparquet = config.write_geoparquet
 
         self.download_url = f"https://ucdp.uu.se/downloads/ged/{self.dataset}-csv.zip"
         self.download_dst = self.raw_dir / f"{self.dataset}-csv.zip"
@@ -190,14 +202,24 @@ class UCDP(Dataset):
                         dst.write(chunk)
         logger.info(f"Downloaded {self.download_dst}")
 
-    def load_data(self):
+    def read_chunks(self, columns):
+        """Stream the CSV out of the zip in typed chunks of `chunk_size` events"""
+        # nullable integers, so a chunk with missing values has the same
+        # column types as every other chunk
+        dtype = {
+            f: "Int64"
+            for f, props in FIELD_DICT.items()
+            if f == "year" or props["filter_type"] == "range"
+        }
+        dtype.update(latitude="float64", longitude="float64")
         with ZipFile(self.download_dst) as zf:
             csv_names = [n for n in zf.namelist() if n.endswith(".csv")]
             if len(csv_names) != 1:
                 raise ValueError(f"Expected 1 CSV in the zip, found {len(csv_names)}")
             with zf.open(csv_names[0]) as f:
-                df = pd.read_csv(f)
-        return df
+                yield from pd.read_csv(
+                    f, usecols=columns, dtype=dtype, chunksize=self.chunk_size
+                )
 
     def process(self):
         logger = self.get_logger()
@@ -207,24 +229,57 @@ class UCDP(Dataset):
             logger.info(f"Output exists, skipping: {output_path}")
             return
 
-        raw_gdf = gpd.GeoDataFrame(
-            self.df,
-            geometry=gpd.points_from_xy(self.df.longitude, self.df.latitude),
-            crs="EPSG:4326",
-        )
-
-        gdf = raw_gdf[list(FIELD_DICT.keys()) + ["geometry"]].copy()
-
-        gdf.to_file(output_path, layer=self.dataset, driver="GPKG")
-
-        return gdf
+        # filter values are gathered chunk by chunk, see update_filter_ingest
+        stats = {
+            f: set() if props["filter_type"] == "categorical" else [None, None]
+            for f, props in FIELD_DICT.items()
+            if "filters" in props["types"]
+        }
+
+        def batches():
+            for chunk in self.read_chunks(list(FIELD_DICT) + ["longitude", "latitude"]):
+                for field, values in stats.items():
+                    if isinstance(values, set):
+                        values.update(chunk[field].dropna().unique().tolist())
+                    else:
+                        lo, hi = chunk[field].min(), chunk[field].max()
+                        if not pd.isna(lo):
+                            values[0] = lo if values[0] is None else min(values[0], lo)
+                            values[1] = hi if values[1] is None else max(values[1], hi)
+
+                yield gpd.GeoDataFrame(
+                    chunk[list(FIELD_DICT)],
+                    geometry=gpd.points_from_xy(chunk.longitude, chunk.latitude),
+                    crs="EPSG:4326",
+                )
+
+        parquet_path = output_path.with_suffix(".parquet")
+        with ExitStack() as stack:
+            tmp = stack.enter_context(
+                self.tmp_to_dst_file(output_path, make_dst_dir=True)
+            )
+            tmp_parquet = (
+                stack.enter_context(self.tmp_to_dst_file(parquet_path))
+                if self.write_geoparquet
+                else None
+            )
+            count = write_vector_batches(
+                batches(), tmp, layer=self.dataset, geoparquet_path=tmp_parquet
+            )
+            # raising here discards the empty temporary files instead of
+            # moving them into place
+            if not count:
+                raise ValueError(f"No events found in {self.download_dst}")
+        logger.info(f"Wrote {output_path} ({count:,} events)")
+
+        return stats
 
 
     def update_filter_ingest(self):
 
         logger = self.get_logger()
 
-        if self.gdf is None:
+        if self.stats is None:
             logger.info("No new data processed; leaving filter_ingest.json as-is")
             return
 
@@ -245,10 +300,10 @@ class UCDP(Dataset):
                 }
                 if props["filter_type"] == "categorical":
                     # unique values sorted
-                    field_dict["categories"] = sorted(self.gdf[field].unique().tolist())
+                    field_dict["categories"] = sorted(self.stats[field])
                 elif props["filter_type"] == "range":
-                    field_dict["min"] = int(self.gdf[field].min())
-                    field_dict["max"] = int(self.gdf[field].max())
+                    field_dict["min"] = int(self.stats[field][0])
+                    field_dict["max"] = int(self.stats[field][1])
                 else:
                     raise ValueError(f"Unknown filter_type: {props['filter_type']}")
 
@@ -267,11 +322,8 @@ class UCDP(Dataset):
         logger.info("Downloading...")
         self.download()
 
-        logger.info("Loading data...")
-        self.df = self.load_data()
-
         logger.info(f"Processing...")
-        self.gdf = self.process()
+        self.stats = self.process()
 
         logger.info("Updating ingest JSON...")
         self.update_filter_ingest()
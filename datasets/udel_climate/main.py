@@ -2,13 +2,16 @@ import tarfile
 from pathlib import Path
 from typing import List
 
-import geopandas as gpd
 import numpy as np
 import pandas as pd
 import rasterio
 import requests
-from data_manager import BaseDatasetConfiguration, Dataset, get_config
-from rasterio import features
+from data_manager import (
+    BaseDatasetConfiguration,
+    Dataset,
+    aggregate_stack,
+    get_config,
+)
 
 
 class UDelClimateConfiguration(BaseDatasetConfiguration):
@@ -82,21 +85,43 @@ class UDelClimate(Dataset):
             with tarfile.open(fpath) as tar:
                 tar.extractall(path=self.raw_dir / dirname)
 
-    def gdf_to_raster(self, gdf, out_path, meta, value_col):
-
-        shapes = list(
-            (geom, value) for geom, value in zip(gdf.geometry, gdf[value_col])
+    @staticmethod
+    def points_to_grid(lon, lat, values, meta):
+        """Place values at regular grid points directly into grid arrays
+
+        The UDel inputs are points at the center of each 0.5 degree cell, so
+        each maps straight to a row/col index of the output grid, replacing
+        point geometries and GDAL rasterization. As with rasterizing, cells
+        without a point are set to nodata, points outside of the grid are
+        dropped, and the last of any duplicate points wins.
+
+        Arguments
+            lon, lat (np.ndarray): coordinates of n points
+            values (np.ndarray): (k, n) array of k values for each point
+            meta (dict): output raster metadata (height, width, transform,
+                dtype, nodata)
+
+        Return
+            (k, height, width) array
+        """
+        transform = meta["transform"]
+        cols = np.floor((lon - transform.c) / transform.a).astype(np.int64)
+        rows = np.floor((lat - transform.f) / transform.e).astype(np.int64)
+        inside = (
+            (rows >= 0) & (rows < meta["height"]) & (cols >= 0) & (cols < meta["width"])
         )
-        out = features.rasterize(
-            list(shapes),
-            out_shape=(meta["height"], meta["width"]),
-            fill=meta["nodata"],
-            transform=meta["transform"],
+
+        grid = np.full(
+            (len(values), meta["height"], meta["width"]),
+            meta["nodata"],
             dtype=meta["dtype"],
         )
+        grid[:, rows[inside], cols[inside]] = values[:, inside]
+        return grid
 
+    def write_raster(self, data, out_path, meta):
         with rasterio.open(out_path, "w", **meta) as dst:
-            dst.write(np.array([out]))
+            dst.write(data, 1)
 
     def convert_file(self, dataset, fpath):
         logger = self.get_logger()
@@ -118,15 +143,18 @@ class UDelClimate(Dataset):
 
         year = fpath.name.split(".")[1]
 
-        # load csv to gdf
+        # load csv
         data = pd.read_csv(fpath, sep=r"\s+", header=None)
         data.columns = ["lon", "lat"] + months + ["extra"]
 
-        gdf = gpd.GeoDataFrame(data, geometry=gpd.points_from_xy(data.lon, data.lat))
-        gdf = gdf.set_crs(epsg=4326)
+        lon = data["lon"].to_numpy(dtype="float64")
+        lat = data["lat"].to_numpy(dtype="float64")
+        # (month, point)
+        month_values = data[months].to_numpy(dtype="float64").T
 
         # monthly
         if self.build_monthly:
+            month_paths = {}
             for m in months:
 
                 out_path = (
@@ -141,13 +169,21 @@ class UDelClimate(Dataset):
                     logger.info(f"\tmonthly {year}_{m} exists, skipping...")
 
                 else:
-                    logger.info(f"\tbuilding monthly {year}_{m}...")
-                    out_path.parent.mkdir(parents=True, exist_ok=True)
+                    month_paths[m] = out_path
+
+            if month_paths:
+                # all 12 months are gridded together
+                month_grids = self.points_to_grid(lon, lat, month_values, meta)
+
+            for m, out_path in month_paths.items():
+                logger.info(f"\tbuilding monthly {year}_{m}...")
+                out_path.parent.mkdir(parents=True, exist_ok=True)
 
-                    self.gdf_to_raster(gdf, out_path, meta, value_col=m)
+                self.write_raster(month_grids[months.index(m)], out_path, meta)
 
         # yearly
         if self.build_yearly:
+            out_paths = {}
             for j in self.methods:
 
                 out_path = (
@@ -162,11 +198,26 @@ class UDelClimate(Dataset):
                     logger.info(f"\tyearly {year}_{j} exists, skipping...")
 
                 else:
-                    logger.info(f"\tbuilding yearly {year}_{j}...")
-                    out_path.parent.mkdir(parents=True, exist_ok=True)
+                    out_paths[j] = out_path
+
+            if out_paths:
+                # all methods are computed together from one pass over the
+                # months, then gridded together
+                yearly = aggregate_stack(
+                    np.ma.masked_invalid(month_values), out_paths.keys()
+                )
+                year_grids = self.points_to_grid(
+                    lon,
+                    lat,
+                    np.array([yearly[j].filled(np.nan) for j in out_paths]),
+                    meta,
+                )
+
+            for ix, (j, out_path) in enumerate(out_paths.items()):
+                logger.info(f"\tbuilding yearly {year}_{j}...")
+                out_path.parent.mkdir(parents=True, exist_ok=True)
 
-                    gdf[f"year_{j}"] = gdf[months].apply(j, axis=1)
-                    self.gdf_to_raster(gdf, out_path, meta, value_col=f"year_{j}")
+                self.write_raster(year_grids[ix], out_path, meta)
 
     def prepare_conversion_tasks(self):
         logger = self.get_logger()
@@ -6,14 +6,16 @@ import os
 import shutil
 import threading
 import urllib.parse
+import zlib
 from pathlib import Path
+from tempfile import mkstemp
 from typing import List, Optional
 
 import numpy as np
 import rasterio
 import requests
 from bs4 import BeautifulSoup
-from data_manager import BaseDatasetConfiguration, Dataset, get_config
+from data_manager import BaseDatasetConfiguration, Dataset, get_config, raster_calc
 
 # EOG (eogdata.mines.edu) moved programmatic access behind a paid OAuth tier, so
 # downloads now authenticate with a browser session cookie (mod_auth_openidc)
@@ -57,6 +59,16 @@ class VIIRS_NTL_Configuration(BaseDatasetConfiguration):
     overwrite_download: bool
     overwrite_extract: bool
     overwrite_processing: bool
+    # Download each .tif.gz straight into processing, decompressing it as it
+    # arrives into a scratch file that is removed once its COG is written,
+    # instead of keeping the .tif.gz and extracted .tif in raw_dir.
+    stream_processing: bool = False
+    # Directory for stream_processing scratch files and the intermediate
+    # tiles of each output, ideally on local disk; empty means the system
+    # temporary directory.
+    scratch_dir: str = ""
+    # number of threads processing windows of each raster (0 uses all cores)
+    calc_workers: int = 0
 
 
 class VIIRS_NTL(Dataset):
@@ -77,6 +89,9 @@ class VIIRS_NTL(Dataset):
         self.overwrite_download: bool = config.overwrite_download
         self.overwrite_extract: bool = config.overwrite_extract
         self.overwrite_processing: bool = config.overwrite_processing
+        self.stream_processing: bool = config.stream_processing
+        self.scratch_dir = config.scratch_dir or None
+        self.calc_workers = config.calc_workers
 
     def test_connection(self):
         # A protected path redirects (302) to the login when the session cookie
@@ -134,7 +149,20 @@ class VIIRS_NTL(Dataset):
             file_config = "vcmslcfg"
         return annual_version, file_config
 
-    def build_download_list(self):
+    def annual_output_path(self, year, ftype) -> Path:
+        return self.output_dir / "annual" / f"viirs_ntl_annual_{year}_{ftype}.tif"
+
+    def monthly_output_path(self, year, format_month, ftype) -> Path:
+        return (
+            self.output_dir / "monthly" / MONTHLY_VERSION / ftype
+            / f"viirs_ntl_monthly_{year}_{format_month}_{ftype}.tif"
+        )
+
+    def build_download_list(self, streaming: bool = False):
+        """
+        Build a (download url, local .tif.gz path) task per file, or a
+        (download url, output COG path) task per file if `streaming`.
+        """
         task_list = []
         logger = self.get_logger()
 
@@ -196,9 +224,12 @@ class VIIRS_NTL(Dataset):
                         )
                         continue
 
-                    local_filename = (
-                        self.raw_dir / "annual" / f"raw_viirs_ntl_{annual_version}_{year}_{ftype}.tif.gz"
-                    )
+                    if streaming:
+                        local_filename = self.annual_output_path(year, ftype)
+                    else:
+                        local_filename = (
+                            self.raw_dir / "annual" / f"raw_viirs_ntl_{annual_version}_{year}_{ftype}.tif.gz"
+                        )
                     task_list.append((download_dest, local_filename))
 
         if self.run_monthly:
@@ -265,10 +296,15 @@ class VIIRS_NTL(Dataset):
                                 f"Download option does not exist yet: {str(year)}/{format_month}/{ftype}"
                             )
                         else:
-                            local_filename = (
-                                self.raw_dir
-                                / "monthly" / f"raw_viirs_ntl_{year}_{format_month}_{ftype}.tif.gz"
-                            )
+                            if streaming:
+                                local_filename = self.monthly_output_path(
+                                    year, format_month, ftype
+                                )
+                            else:
+                                local_filename = (
+                                    self.raw_dir
+                                    / "monthly" / f"raw_viirs_ntl_{year}_{format_month}_{ftype}.tif.gz"
+                                )
                             task_list.append((file_link, local_filename))
 
         return task_list
@@ -302,8 +338,10 @@ class VIIRS_NTL(Dataset):
                         )
                     # raise an exception (fail this task) if HTTP response indicates that an error occured
                     src.raise_for_status()
-                    with open(local_filename, "wb") as dst:
-                        dst.write(src.content)
+                    with self.tmp_to_dst_file(local_filename) as tmp:
+                        with open(tmp, "wb") as dst:
+                            for chunk in src.iter_content(chunk_size=1024 * 1024):
+                                dst.write(chunk)
             except Exception as e:
                 raise RuntimeError(
                     str(e) + f": Failed to download: {str(download_dest)}"
@@ -398,15 +436,12 @@ class VIIRS_NTL(Dataset):
         logger = self.get_logger()
 
         if self.run_annual:
-            annual_dir = self.output_dir / "annual"
             for year in self.years:
                 for ftype in self.annual_file_types:
                     raw_annual_glob_str = (
                         self.raw_dir / "annual" / ftype /f"raw_extracted_viirs_ntl_{year}_{ftype}.tif"
                     )
-                    output_annual_glob = (
-                        annual_dir / f"viirs_ntl_annual_{year}_{ftype}.tif"
-                    )
+                    output_annual_glob = self.annual_output_path(year, ftype)
                     if raw_annual_glob_str.exists():
                         task_list.append((raw_annual_glob_str, output_annual_glob))
                     else:
@@ -415,7 +450,6 @@ class VIIRS_NTL(Dataset):
                         )
 
         if self.run_monthly:
-            monthly_dir = self.output_dir / "monthly" / MONTHLY_VERSION
             for year in self.years:
                 for month in self.months:
                     format_month = str(month).zfill(2)
@@ -424,8 +458,8 @@ class VIIRS_NTL(Dataset):
                             self.raw_dir / "monthly"
                             / f"raw_extracted_viirs_ntl_{year}_{format_month}_{ftype}.tif"
                         )
-                        output_monthly_glob = (
-                            monthly_dir / ftype / f"viirs_ntl_monthly_{year}_{format_month}_{ftype}.tif"
+                        output_monthly_glob = self.monthly_output_path(
+                            year, format_month, ftype
                         )
                         if raw_monthly_glob_str.exists():
                             task_list.append((raw_monthly_glob_str, output_monthly_glob))
@@ -436,41 +470,29 @@ class VIIRS_NTL(Dataset):
 
         return task_list
 
-    def raster_calc(self, input_path, output_path, function, **kwargs):
+    def raster_calc(self, input_path, output_path, function):
         """
-        Calculate raster values using rasterio based on function provided
+        Calculate raster values with a windowed, multi-threaded read of the
+        input raster, based on the function provided
 
         :param input_path: input raster
         :param output_path: path to write output raster to
-        :param function: function to apply to input raster values
-        :param kwargs: additional meta args used to write output raster
+        :param function: function to apply to a window of input raster values
         """
-        with rasterio.Env(GDAL_CACHEMAX=100, CHECK_DISK_FREE_SPACE=False):
-            # GDAL_CACHEMAX value in MB
-            # https://trac.osgeo.org/gdal/wiki/ConfigOptions#GDAL_CACHEMAX
-            # See: https://github.com/mapbox/rasterio/issues/1281
-            with rasterio.open(input_path) as src:
-                assert len(set(src.block_shapes)) == 1
-                meta = src.meta.copy()
-                meta.update(
-                    {
-                        "driver": "COG",
-                        "compress": "LZW",
-                        # global VIIRS rasters are large enough to trip GDAL's
-                        # Classic TIFF 4GB/32-bit-offset limit mid-write
-                        "BIGTIFF": "YES",
-                    }
-                )
-                meta.update(**kwargs)
-                with self.tmp_to_dst_file(
-                    output_path, make_dst_dir=True, validate_cog=True
-                ) as tmp_dst_path:
-                    with rasterio.open(tmp_dst_path, "w", **meta) as dst:
-                        for ji, window in src.block_windows(1):
-                            in_data = src.read(window=window)
-                            out_data = function(in_data)
-                            out_data = out_data.astype(meta["dtype"])
-                            dst.write(out_data, window=window)
+        with rasterio.Env(CHECK_DISK_FREE_SPACE=False), self.tmp_to_dst_file(
+            output_path, make_dst_dir=True, validate_cog="sampled"
+        ) as tmp_dst_path:
+            raster_calc(
+                [input_path],
+                {tmp_dst_path: function},
+                # the cf_cvg mask is binary, so its overviews mustn't average
+                categorical={tmp_dst_path: self.is_mask(output_path)},
+                max_workers=self.calc_workers or None,
+                scratch_dir=self.scratch_dir,
+                # global VIIRS rasters are large enough to trip GDAL's
+                # Classic TIFF 4GB/32-bit-offset limit mid-write
+                BIGTIFF="YES",
+            )
 
     def remove_negative(self, x):
         """
@@ -485,22 +507,76 @@ class VIIRS_NTL(Dataset):
         threshold = self.cf_minimum
         return np.where(x >= threshold, 1, 0)
 
+    def is_mask(self, path):
+        """
+        Whether the given raw or output file is a binary cf_cvg mask
+        """
+        return "cf_cvg" in str(path)
+
+    def calc_function(self, path):
+        """
+        Function to apply to the values of the given raw or output file
+        """
+        if self.is_mask(path):
+            return self.make_binary
+        return self.remove_negative
+
     def process_files(self, raw_file, output_dst):
         logger = self.get_logger()
         if output_dst.exists() and not self.overwrite_processing:
             logger.info(f"Processed File Exists: {str(raw_file)}")
             return (raw_file, output_dst)
         try:
-            if "cf_cvg" in str(raw_file):
-                self.raster_calc(raw_file, output_dst, self.make_binary)
-            else:
-                self.raster_calc(raw_file, output_dst, self.remove_negative)
+            self.raster_calc(raw_file, output_dst, self.calc_function(raw_file))
             logger.info(f"File Processed: {str(output_dst)}")
             return (raw_file, output_dst)
         except Exception as e:
             logger.info(f"Failed to process: {str(raw_file)}")
             raise Exception(str(e) + f": Failed to process: {str(raw_file)}")
 
+    def stream_file(self, download_dest, output_dst):
+        """
+        Download, decompress and process an individual file in one pass
+        """
+        logger = self.get_logger()
+
+        if output_dst.exists() and not self.overwrite_processing:
+            logger.info(f"Processed File Exists: {str(output_dst)}")
+            return (download_dest, output_dst)
+
+        logger.info(f"Attempting to stream from {download_dest}...")
+        fd, scratch_path = mkstemp(suffix=".tif", dir=self.scratch_dir)
+        os.close(fd)
+        try:
+            with requests.get(
+                download_dest,
+                cookies=self.cookies,
+                stream=True,
+                allow_redirects=False,
+            ) as src:
+                if src.is_redirect:
+                    raise RuntimeError(
+                        "redirected to login (EOG session cookie expired?)"
+                    )
+                src.raise_for_status()
+                # gunzip the body incrementally as it arrives
+                decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+                with open(scratch_path, "wb") as dst:
+                    for chunk in src.iter_content(chunk_size=1024 * 1024):
+                        dst.write(decompressor.decompress(chunk))
+                    dst.write(decompressor.flush())
+                if not decompressor.eof:
+                    raise RuntimeError("download ended before the end of the gzip stream")
+
+            self.raster_calc(scratch_path, output_dst, self.calc_function(output_dst))
+        except Exception as e:
+            raise RuntimeError(str(e) + f": Failed to stream: {str(download_dest)}")
+        finally:
+            os.remove(scratch_path)
+
+        logger.info(f"File Processed: {str(output_dst)}")
+        return (download_dest, output_dst)
+
     def main(self):
         logger = self.get_logger()
 
@@ -511,6 +587,15 @@ class VIIRS_NTL(Dataset):
             logger.info("Testing Connection...")
             self.test_connection()
 
+            if self.stream_processing:
+                logger.info("Building download list...")
+                stream_list = self.build_download_list(streaming=True)
+
+                logger.info("Streaming downloads into processing")
+                stream = self.run_tasks(self.stream_file, stream_list)
+                self.log_run(stream)
+                return
+
             os.makedirs(self.raw_dir, exist_ok=True)
             logger.info("Building download list...")
             dl_list = self.build_download_list()
@@ -1,14 +1,22 @@
+import os
 import zipfile
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from pathlib import Path
 
 import fiona
-import geopandas as gpd
 import numpy as np
 import rasterio
 import requests
 from affine import Affine
-from data_manager import BaseDatasetConfiguration, Dataset, get_config
-from rasterio import features
+from data_manager import (
+    BaseDatasetConfiguration,
+    Dataset,
+    get_config,
+    read_vector,
+    sql_in,
+)
+from rasterio import features, windows
+from shapely.geometry import box
 
 
 class WDPAConfiguration(BaseDatasetConfiguration):
@@ -18,6 +26,10 @@ class WDPAConfiguration(BaseDatasetConfiguration):
     max_retries: int
     overwrite_download: bool
     overwrite_output: bool
+    # size (in pixels) of the square windows the global grid is rasterized in
+    window_size: int = 4096
+    # threads rasterizing windows concurrently; 0 uses all available cores
+    rasterize_threads: int = 0
 
 
 class WDPA(Dataset):
@@ -41,6 +53,9 @@ class WDPA(Dataset):
         self.overwrite_download = config.overwrite_download
         self.overwrite_output = config.overwrite_output
 
+        self.window_size = config.window_size
+        self.rasterize_threads = config.rasterize_threads or os.cpu_count()
+
         self.pixel_size = 0.01
 
         self.field_name = "IUCN_CAT"
@@ -124,70 +139,115 @@ class WDPA(Dataset):
 
         self.poly_layer = poly_layers[0]
 
-    def process_data(self):
-        """Rasterize features from gdb file"""
-        logger = self.get_logger()
+    def rasterize_window(self, window, geometries, codes):
+        """Rasterize the categories of all features intersecting a window
 
-        logger.info("Loading features")
-        # load features from gdb
-        input_features = gpd.read_file(self.gdb_path, layer=self.poly_layer)
+        Pixels touched by features of a single category get that category's
+        code, and pixels touched by features of more than one category get 11.
+        """
+        out = np.zeros((window.height, window.width), dtype=np.uint8)
+
+        window_bounds = windows.bounds(window, self.affine)
+        idx = geometries.sindex.query(box(*window_bounds))
+        if len(idx) == 0:
+            return out
+
+        transform = windows.transform(window, self.affine)
+        window_geometries = geometries.iloc[idx]
+        window_codes = codes[idx]
+
+        # GDAL has no merge rule for "distinct values", so features are
+        # burned one category at a time into the shared uint8 window
+        for code in np.unique(window_codes):
+            burned = features.rasterize(
+                window_geometries[window_codes == code],
+                out_shape=out.shape,
+                transform=transform,
+                fill=0,
+                default_value=1,
+                all_touched=True,
+                dtype="uint8",
+            ).view(bool)
+            out[burned & (out != 0)] = 11
+            out[burned & (out == 0)] = code
 
-        # init output raster
-        output_raster = np.zeros(shape=(self.out_shape[0], self.out_shape[1]))
+        return out
 
-        logger.info("Building categories")
-        # iterate over the 10 categories and rasterize each, then
-        # add rasterized layer to output raster and assign pixels
-        # associated with multiple feature across categories to 11
-        for index, cat in enumerate(self.field_values):
+    def process_data(self):
+        """Rasterize features from gdb file
 
-            features_filtered = input_features.loc[
-                input_features[self.field_name] == cat, "geometry"
-            ]
+        The global grid is rasterized in windows of `self.window_size`
+        pixels on a thread pool, each window only burning the features that
+        intersect it, and written to the output as each window completes.
+        """
+        logger = self.get_logger()
 
+        logger.info("Loading features")
+        # load only features of the selected categories from gdb
+        input_features = read_vector(
+            self.gdb_path,
+            layer=self.poly_layer,
+            columns=[self.field_name],
+            where=sql_in(self.field_name, self.field_values),
+        )
+
+        # code each feature by its category (1-10), dropping other categories
+        category_codes = {
+            cat: index + 1 for index, cat in enumerate(self.field_values)
+        }
+        feature_codes = input_features[self.field_name].map(category_codes)
+        selected = feature_codes.notna()
+        geometries = input_features.geometry[selected].reset_index(drop=True)
+        codes = feature_codes[selected].to_numpy(dtype=np.uint8)
+
+        for cat, code in category_codes.items():
             logger.info(
                 "selected {0} features for field: {1}".format(
-                    len(features_filtered), cat
+                    np.count_nonzero(codes == code), cat
                 )
             )
 
-            if len(features_filtered) == 0:
-                logger.info("\tno feature selected for year {0}".format(cat))
-                pass
+        # build spatial index up front, rather than in the first window to use it
+        geometries.sindex
 
-            cat_raster = features.rasterize(
-                features_filtered,
-                out_shape=self.out_shape,
-                transform=self.affine,
-                fill=0,
-                default_value=index + 1,
-                all_touched=True,
-                dtype=None,
+        height, width = self.out_shape
+        window_list = [
+            windows.Window(
+                col_off,
+                row_off,
+                min(self.window_size, width - col_off),
+                min(self.window_size, height - row_off),
             )
+            for row_off in range(0, height, self.window_size)
+            for col_off in range(0, width, self.window_size)
+        ]
 
-            output_raster = output_raster + cat_raster
-
-            output_raster = np.where(output_raster > (index + 1), 11, output_raster)
-
-        # export the finalized raster
-        logger.info("Exporting raster")
+        logger.info(f"Rasterizing categories in {len(window_list)} windows")
         meta = {
             "count": 1,
             "crs": {"init": "epsg:4326"},
             "dtype": "uint8",
             "transform": self.affine,
             "driver": "GTiff",
-            "height": output_raster.shape[0],
-            "width": output_raster.shape[1],
+            "height": height,
+            "width": width,
             "nodata": 0,
             "compress": "lzw",
+            "tiled": True,
+            "blockxsize": 512,
+            "blockysize": 512,
         }
 
-        raster_out = np.array([output_raster])
-
         self.output_path.parent.mkdir(parents=True, exist_ok=True)
-        with rasterio.open(self.output_path, "w", **meta) as dst:
-            dst.write(raster_out)
+        with rasterio.open(self.output_path, "w", **meta) as dst, ThreadPoolExecutor(
+            max_workers=self.rasterize_threads
+        ) as pool:
+            futures = {
+                pool.submit(self.rasterize_window, window, geometries, codes): window
+                for window in window_list
+            }
+            for future in as_completed(futures):
+                dst.write(future.result(), 1, window=futures[future])
 
     def main(self):
 
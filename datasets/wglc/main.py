@@ -13,10 +13,15 @@ import hashlib
 from pathlib import Path
 
 import netCDF4 as nc
-import numpy as np
 import rasterio
 import requests
-from data_manager import BaseDatasetConfiguration, Dataset, get_config
+from data_manager import (
+    BaseDatasetConfiguration,
+    Dataset,
+    aggregate_rasters,
+    file_key,
+    get_config,
+)
 
 OUTPUT_CRS = "EPSG:4326"
 VARIABLE = "density"
@@ -33,7 +38,9 @@ class WGLCConfiguration(BaseDatasetConfiguration):
     expected_md5: str
     # How to aggregate a year's 12 monthly bands: "sum" (default) totals the
     # monthly density values as a proxy for annual lightning activity;
-    # "mean"/"max"/"min" are also supported.
+    # "mean"/"max"/"min" are also supported. Several methods can be given,
+    # comma-separated (e.g. "sum,max"); all are computed from one read of
+    # the year's monthly rasters.
     year_agg_method: str
     overwrite_download: bool
     overwrite_processing: bool
@@ -45,11 +52,13 @@ class WGLC(Dataset):
     def __init__(self, config: WGLCConfiguration):
         self.raw_dir = Path(config.raw_dir)
         self.output_dir = Path(config.output_dir)
-        self.year_agg_method = config.year_agg_method
+        self.year_agg_methods = [
+            v.strip() for v in config.year_agg_method.split(",") if v.strip()
+        ]
         self.monthly_dir = self.output_dir / "monthly"
         # subdirectory per aggregation method, so switching year_agg_method
         # doesn't collide with or overwrite output from a different method
-        self.yearly_dir = self.output_dir / "yearly" / self.year_agg_method
+        self.yearly_dir = self.output_dir / "yearly"
         self.download_url = config.download_url
         self.expected_md5 = config.expected_md5
         self.overwrite_download = config.overwrite_download
@@ -102,23 +111,28 @@ class WGLC(Dataset):
             logger.info(f"Output exists, skipping: {output_path}")
             return
 
+        # reuse this thread's handle on the NetCDF across bands
         subdataset = f'NETCDF:"{self.download_path.as_posix()}":{VARIABLE}'
-        with rasterio.open(subdataset) as src:
-            data = src.read(band)
-            meta = src.meta.copy()
-            meta.update(
-                count=1,
-                driver="COG",
-                compress="LZW",
-                crs=OUTPUT_CRS,
-                nodata=src.nodata,
-            )
+        src = self.cached(
+            ("wglc", subdataset, file_key(self.download_path)),
+            lambda: rasterio.open(subdataset),
+            per_thread=True,
+        )
+        data = src.read(band)
+        meta = src.meta.copy()
+        meta.update(
+            count=1,
+            driver="COG",
+            compress="LZW",
+            crs=OUTPUT_CRS,
+            nodata=src.nodata,
+        )
 
-            with self.tmp_to_dst_file(
-                output_path, make_dst_dir=True, validate_cog=True
-            ) as tmp_dst:
-                with rasterio.open(tmp_dst, "w", **meta) as dst:
-                    dst.write(data, 1)
+        with self.tmp_to_dst_file(
+            output_path, make_dst_dir=True, validate_cog=True
+        ) as tmp_dst:
+            with rasterio.open(tmp_dst, "w", **meta) as dst:
+                dst.write(data, 1)
         logger.info(f"Saved {output_path}")
 
     def build_year_tasks(self):
@@ -133,42 +147,23 @@ class WGLC(Dataset):
             if len(files) == 12
         ]
 
-    def aggregate_rasters(self, file_list):
-        """Aggregate same-shape rasters with self.year_agg_method, respecting nodata."""
-        stack = None
-        profile = None
-        for i, path in enumerate(sorted(file_list)):
-            with rasterio.open(path) as src:
-                data = src.read(1, masked=True)
-                if profile is None:
-                    profile = src.profile
-                if stack is None:
-                    stack = np.ma.empty((len(file_list), *data.shape), dtype=data.dtype)
-                stack[i] = data
-
-        if self.year_agg_method == "sum":
-            result = stack.sum(axis=0)
-        elif self.year_agg_method == "mean":
-            result = stack.mean(axis=0)
-        elif self.year_agg_method == "max":
-            result = stack.max(axis=0)
-        elif self.year_agg_method == "min":
-            result = stack.min(axis=0)
-        else:
-            raise ValueError(f"Unsupported year_agg_method: {self.year_agg_method!r}")
-
-        return result.filled(profile["nodata"]), profile
-
     def process_year(self, year: str, month_files: list):
-        """Aggregate a year's monthly COGs into a single annual COG."""
+        """Aggregate a year's monthly COGs into an annual COG per method."""
         logger = self.get_logger()
 
-        output_path = self.yearly_dir / f"wglc_density_{year}.tif"
-        if output_path.exists() and not self.overwrite_processing:
-            logger.info(f"Output exists, skipping: {output_path}")
+        output_paths = {
+            method: self.yearly_dir / method / f"wglc_density_{year}.tif"
+            for method in self.year_agg_methods
+        }
+        if not self.overwrite_processing:
+            for method, output_path in list(output_paths.items()):
+                if output_path.exists():
+                    logger.info(f"Output exists, skipping: {output_path}")
+                    del output_paths[method]
+        if not output_paths:
             return
 
-        data, profile = self.aggregate_rasters(month_files)
+        results, profile = aggregate_rasters(month_files, output_paths.keys())
         # profile comes from a monthly COG's own tiling metadata (blockxsize/
         # blockysize/tiled/interleave), which the COG driver computes itself
         # and warns about if passed back in as creation options
@@ -176,12 +171,14 @@ class WGLC(Dataset):
             profile.pop(key, None)
         profile.update(driver="COG", compress="LZW")
 
-        with self.tmp_to_dst_file(
-            output_path, make_dst_dir=True, validate_cog=True
-        ) as tmp_dst:
-            with rasterio.open(tmp_dst, "w", **profile) as dst:
-                dst.write(data, 1)
-        logger.info(f"Saved {output_path}")
+        for method, data in results.items():
+            output_path = output_paths[method]
+            with self.tmp_to_dst_file(
+                output_path, make_dst_dir=True, validate_cog=True
+            ) as tmp_dst:
+                with rasterio.open(tmp_dst, "w", **profile) as dst:
+                    dst.write(data, 1)
+            logger.info(f"Saved {output_path}")
 
     def main(self):
         logger = self.get_logger()
@@ -99,8 +99,11 @@ class WorldPopCount(Dataset):
         logger = self.get_logger()
 
         flist = []
+        # hidden files are downloads still in progress, see tmp_to_dst_file
         downloaded_files = [
-            i for i in self.raw_dir.iterdir() if str(i).endswith(".tif")
+            i
+            for i in self.raw_dir.iterdir()
+            if i.name.endswith(".tif") and not i.name.startswith(".")
         ]
         for i in downloaded_files:
             year = int(i.name.split("_")[1])
@@ -110,8 +110,11 @@ class WorldPopCount(Dataset):
         logger = self.get_logger()
 
         flist = []
+        # hidden files are downloads still in progress, see tmp_to_dst_file
         downloaded_files = [
-            i for i in self.raw_dir.iterdir() if str(i).endswith(".tif")
+            i
+            for i in self.raw_dir.iterdir()
+            if i.name.endswith(".tif") and not i.name.startswith(".")
         ]
         for i in downloaded_files:
             # e.g. global_pop_2020_CN_1km_R2025A_v1.tif -> 2020
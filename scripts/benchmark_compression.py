@@ -0,0 +1,32 @@
+"""
+Compare compression options for a raster output, to pick the codec, predictor
+and level that balance storage against read throughput (see
+data_manager.compression_profile for the defaults).
+
+A window from the center of each raster is written with every candidate and
+read back; the table lists each candidate's compressed size, compression
+ratio, write time and read throughput, smallest first.
+
+Usage:
+    python scripts/benchmark_compression.py <raster> [<raster> ...]
+"""
+
+import sys
+
+from data_manager import benchmark_compression
+
+
+def report(path):
+    print(path)
+    print(f"{'candidate':<12} {'MB':>9} {'ratio':>7} {'write s':>8} {'read MB/s':>10}")
+    for row in benchmark_compression(path):
+        print(
+            f"{row['name']:<12} {row['bytes'] / 1024**2:>9.2f} {row['ratio']:>7.2f} "
+            f"{row['write_seconds']:>8.3f} {row['read_mb_per_s']:>10.1f}"
+        )
+    print()
+
+
+if __name__ == "__main__":
+    for p in sys.argv[1:]:
+        report(p)